@@ -0,0 +1,403 @@
+# financial_social_media/caching.py
+"""
+Per-model version stamps, conditional GET and a versioned result cache
+for API views.
+
+Every write to a tracked model bumps that model's stamp in the cache:
+model signals for ORM writes, `bump_version` for the raw SQL and
+`.update()` paths that bypass signals. Views mixing in
+`ConditionalGetMixin` derive their ETag and Last-Modified from the stamps
+of the models they render, so a matching request is answered with 304
+before any queryset or serializer work. `CachedResultMixin` also keeps
+the rendered data under a key built from the same stamps: a write moves
+every affected key forward, so nothing is ever scanned or deleted, and
+stale entries simply age out; one worker recomputes a missing result
+while the others are served the previous one. `FragmentCacheMixin` does the same for
+single objects rendered by nested serializers, with a stamp per object.
+
+The stamps live in the default cache, which must be shared between
+workers for the validators to agree across processes; a system check
+warns when it is process-local outside DEBUG.
+"""
+import hashlib
+import logging
+import threading
+import time
+from functools import partial, wraps
+
+from django.apps import apps
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.cache import get_conditional_response, patch_vary_headers, quote_etag
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+VERSION_TIMEOUT = None  # stamps never expire on their own
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [checks.Warning(
+        'The default cache is local to each process, so version stamps, '
+        'cached results and recompute locks are not shared between workers.',
+        hint='Set REDIS_URL, or run a single worker.',
+        id='financial_social_media.W001',
+    )]
+
+
+def version_key(label):
+    return f'model-version:{label.lower()}'
+
+
+def _bump(label):
+    cache.set(version_key(label), time.time_ns(), VERSION_TIMEOUT)
+
+
+def bump_version(label):
+    """
+    Mark `label` ('app_label.ModelName') as changed.
+
+    The stamp is bumped right away and again when the surrounding
+    transaction commits, so a read that raced the write can't leave a
+    stale representation cached under the newest stamp.
+    """
+    _bump(label)
+    transaction.on_commit(lambda: _bump(label))
+
+
+def object_version_key(label, pk):
+    return f'object-version:{label.lower()}:{pk}'
+
+
+def bump_object_version(label, pk):
+    """
+    Mark one object as changed, e.g. after an `.update()` on it.
+    """
+    def bump():
+        cache.set(object_version_key(label, pk), time.time_ns(), VERSION_TIMEOUT)
+    bump()
+    transaction.on_commit(bump)
+
+
+def get_object_version(label, pk):
+    key = object_version_key(label, pk)
+    stamp = cache.get(key)
+    if stamp is None:
+        cache.add(key, time.time_ns(), VERSION_TIMEOUT)
+        stamp = cache.get(key)
+    return stamp
+
+
+def get_versions(labels):
+    """
+    Return `{label: stamp_ns}`. Unknown stamps are initialised to now.
+    """
+    keys = {version_key(label): label for label in labels}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, time.time_ns(), VERSION_TIMEOUT)
+        found[key] = cache.get(key)
+    return {label: found[key] for key, label in keys.items()}
+
+
+def track_changes(*labels, ignore_fields=()):
+    """
+    Bump each model's stamp on save and delete. Call from AppConfig.ready.
+    Saves limited to `ignore_fields` (e.g. last_login) don't count.
+    """
+    for label in labels:
+        model = apps.get_model(label)
+        receiver = _receiver_for(label, frozenset(ignore_fields))
+        post_save.connect(receiver, sender=model, weak=False, dispatch_uid=f'version-{label}-save')
+        post_delete.connect(receiver, sender=model, weak=False, dispatch_uid=f'version-{label}-delete')
+
+
+def _receiver_for(label, ignore_fields):
+    def receiver(sender, instance, update_fields=None, **kwargs):
+        if update_fields and ignore_fields and update_fields <= ignore_fields:
+            return
+        bump_version(label)
+        bump_object_version(label, instance.pk)
+    return receiver
+
+
+RESULT_OUTCOMES = ('hits', 'misses', 'stale', 'coalesced')
+
+
+def record_result_cache(name, outcome):
+    key = f'result-cache-stats:{name}:{outcome}'
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr(); losing one count is fine
+        pass
+
+
+def result_cache_stats():
+    """
+    Return per-view result cache counts for every view using
+    CachedResultMixin: fresh hits, misses (recomputed), stale values
+    served, and coalesced requests that waited for another worker.
+    `hit_rate` counts everything not recomputed.
+    """
+    stats = {}
+    for name in sorted(CachedResultMixin.cached_views):
+        keys = {f'result-cache-stats:{name}:{outcome}': outcome for outcome in RESULT_OUTCOMES}
+        found = cache.get_many(keys)
+        counts = {outcome: found.get(key, 0) for key, outcome in keys.items()}
+        total = sum(counts.values())
+        served = total - counts['misses']
+        counts['hit_rate'] = round(served / total, 3) if total else None
+        stats[name] = counts
+    return stats
+
+
+def refresh_in_background(target):
+    """
+    Run `target` on a daemon thread with its own database connection.
+    """
+    def run():
+        try:
+            target()
+        except Exception:
+            logger.exception('Background result cache refresh failed')
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def versioned_read(method):
+    """
+    Run a read-only view method through the view's conditional_response,
+    e.g. for GET actions next to list and retrieve.
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        return self.conditional_response(partial(method, self), request, *args, **kwargs)
+    return wrapper
+
+
+class ConditionalGetMixin:
+    """
+    Weak ETag and Last-Modified on `list` and `retrieve`.
+
+    `version_models` lists every model the responses render. The ETag
+    also covers the full path and the requesting user, since visibility
+    and viewer fields differ per user.
+    """
+    version_models = ()
+
+    @versioned_read
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @versioned_read
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_request_identity(self, request):
+        """
+        What a response depends on apart from the data: path and query,
+        viewer and media type.
+        """
+        user_id = request.user.pk if request.user.is_authenticated else ''
+        identity = '|'.join([
+            request.get_full_path(), str(user_id), request.accepted_media_type or '',
+        ])
+        return hashlib.sha1(identity.encode()).hexdigest()
+
+    def get_version_token(self, request):
+        versions = get_versions(self.version_models)
+        token = '|'.join([
+            self.get_request_identity(request),
+            *(f'{label}={versions[label]}' for label in sorted(versions)),
+        ])
+        return hashlib.sha1(token.encode()).hexdigest(), max(versions.values())
+
+    def conditional_response(self, view, request, *args, **kwargs):
+        token, stamp = self.get_version_token(request)
+        etag = 'W/' + quote_etag(token)
+        last_modified = stamp // 1_000_000_000
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.get_fresh_response(view, token, request, *args, **kwargs)
+        # A stale body must not be validated as the current version
+        if response.status_code in (200, 304) and response.get('X-Cache') != 'STALE':
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
+
+    def get_fresh_response(self, view, token, request, *args, **kwargs):
+        return view(request, *args, **kwargs)
+
+
+class CachedResultMixin(ConditionalGetMixin):
+    """
+    ConditionalGetMixin plus a cache of the serialized response data,
+    keyed by the version token, for `result_cache_timeout` seconds
+    (RESULT_CACHE_TIMEOUT by default).
+
+    Misses are single-flight: one request per identity takes a short lock
+    and recomputes while the others get the last value computed for the
+    same identity (stale-while-revalidate) or, when there is none, wait
+    up to RESULT_CACHE_WAIT seconds for the leader's result. With
+    RESULT_CACHE_BACKGROUND_REFRESH on, the leader also serves the stale
+    value and recomputes on a background thread.
+
+    Stale values are never served for `retrieve` (an object that was
+    deleted or hidden must not come back), and a recompute that isn't a
+    200 drops the identity's stale value.
+
+    Responses say `X-Cache: HIT`, `MISS` or `STALE`; totals per view are
+    in `result_cache_stats`.
+    """
+    result_cache_timeout = None
+    stale_exempt_actions = {'retrieve'}
+    cached_views = set()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        CachedResultMixin.cached_views.add(cls.__name__)
+
+    def get_result_cache_timeout(self):
+        if self.result_cache_timeout is not None:
+            return self.result_cache_timeout
+        return getattr(settings, 'RESULT_CACHE_TIMEOUT', 300)
+
+    def serves_stale(self):
+        return getattr(self, 'action', None) not in self.stale_exempt_actions
+
+    def cached_response(self, data, outcome):
+        record_result_cache(type(self).__name__, outcome)
+        response = Response(data)
+        response['X-Cache'] = 'STALE' if outcome == 'stale' else 'HIT'
+        return response
+
+    def get_result_keys(self, request, token):
+        """
+        Return the keys of the fresh result, of the last result for this
+        request identity whatever its version, and of the recompute lock.
+        """
+        name = type(self).__name__
+        identity = self.get_request_identity(request)
+        return (
+            f'result:{name}:{token}',
+            f'result-stale:{name}:{identity}',
+            f'result-lock:{name}:{identity}',
+        )
+
+    def get_fresh_response(self, view, token, request, *args, **kwargs):
+        name = type(self).__name__
+        fresh_key, stale_key, lock_key = self.get_result_keys(request, token)
+
+        data = cache.get(fresh_key)
+        if data is not None:
+            return self.cached_response(data, 'hits')
+
+        stale = cache.get(stale_key) if self.serves_stale() else None
+        lock_timeout = getattr(settings, 'RESULT_CACHE_LOCK_TIMEOUT', 10)
+        if cache.add(lock_key, token, lock_timeout):
+            compute = partial(
+                self.compute_result, view, fresh_key, stale_key, lock_key, request, *args, **kwargs
+            )
+            # A refresh on another connection can't see this request's
+            # transaction, so inside one the leader recomputes in line
+            background = (
+                getattr(settings, 'RESULT_CACHE_BACKGROUND_REFRESH', True)
+                and not connection.in_atomic_block
+            )
+            if stale is not None and background:
+                refresh_in_background(compute)
+                return self.cached_response(stale, 'stale')
+            record_result_cache(name, 'misses')
+            response = compute()
+            response['X-Cache'] = 'MISS'
+            return response
+
+        # Another worker is recomputing this identity
+        if stale is not None:
+            return self.cached_response(stale, 'stale')
+        data = self.wait_for(fresh_key)
+        if data is not None:
+            return self.cached_response(data, 'coalesced')
+        record_result_cache(name, 'misses')
+        response = view(request, *args, **kwargs)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def compute_result(self, view, fresh_key, stale_key, lock_key, request, *args, **kwargs):
+        try:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                # e.g. the object was deleted or made private since
+                cache.delete(stale_key)
+                return response
+            cache.set(fresh_key, response.data, self.get_result_cache_timeout())
+            if self.serves_stale():
+                stale_timeout = getattr(settings, 'RESULT_CACHE_STALE_TIMEOUT', 60 * 60)
+                cache.set(stale_key, response.data, stale_timeout)
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    def wait_for(self, key):
+        deadline = time.monotonic() + getattr(settings, 'RESULT_CACHE_WAIT', 2)
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            data = cache.get(key)
+            if data is not None:
+                return data
+        return None
+
+
+class FragmentCacheMixin:
+    """
+    Cache a serializer's output per object, keyed by primary key and the
+    object's version stamp, which tracked saves and deletes bump.
+
+    Within one response each object is rendered at most once (a page of
+    posts by the same author reuses the first rendering), and across
+    responses fragments come from the cache until the object changes.
+    Output that depends on anything else (a nested object, the request)
+    must be covered by `get_fragment_key_parts`.
+    """
+    fragment_timeout = 60 * 60
+
+    def get_fragment_key_parts(self, instance):
+        """
+        Extra key parts, besides the object's own stamp.
+        """
+        return []
+
+    def to_representation(self, instance):
+        label = self.Meta.model._meta.label
+        memo = self.context.setdefault('fragments', {})
+        memo_key = (type(self).__name__, instance.pk)
+        if memo_key in memo:
+            return memo[memo_key]
+
+        parts = [get_object_version(label, instance.pk), *self.get_fragment_key_parts(instance)]
+        key = f'fragment:{type(self).__name__}:{instance.pk}:' + ':'.join(map(str, parts))
+        data = cache.get(key)
+        if data is None:
+            data = super().to_representation(instance)
+            cache.set(key, data, self.fragment_timeout)
+        memo[memo_key] = data
+        return data
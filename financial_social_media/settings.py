@@ -118,6 +118,21 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'news.pagination.NewsArticlePagination',
 }
 
+# Home timelines: communities above this size are merged in at read time
+# instead of being fanned out, and timelines are trimmed to this length
+TIMELINE_FANOUT_MEMBER_LIMIT = 5000
+TIMELINE_MAX_LENGTH = 500
+
+# Latest top-level comments embedded in each serialized post
+COMMENT_PREVIEW_SIZE = 3
+
+# Write-behind reactions: acknowledge right away, collapse per (post, user)
+# in REACTION_BUFFER and apply in bulk every REACTION_FLUSH_INTERVAL seconds.
+# LocalReactionBuffer is per process: only for a single worker or development
+REACTION_WRITE_BEHIND = os.getenv('REACTION_WRITE_BEHIND', 'false').lower() == 'true'
+REACTION_BUFFER = 'reactions.buffer.LocalReactionBuffer'
+REACTION_FLUSH_INTERVAL = 2
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -164,6 +179,59 @@ DATABASES = {
     }
 }
 
+# Version stamps and cached API results must be shared by every worker in
+# production (set REDIS_URL); local memory is enough for a single process
+# and for tests, and is reported by a system check (W001) outside DEBUG
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'financial-social-media',
+        }
+    }
+
+# Rows per INSERT ... ON CONFLICT statement when ingesting news
+NEWS_INGEST_BATCH_SIZE = 1000
+# Articles whose estimated shingle similarity (news.fingerprints) is at
+# least this, published within this many hours of each other, are
+# near-duplicates
+NEWS_DUPLICATE_SIMILARITY = 0.7
+NEWS_DUPLICATE_WINDOW_HOURS = 72
+
+# Local sentiment classifier (news.sentiment), trained with
+# train_news_sentiment; ingest uses it for articles without a sentiment
+NEWS_SENTIMENT_MODEL_PATH = os.path.join(BASE_DIR, 'ml_models', 'news_sentiment.joblib')
+NEWS_SENTIMENT_ON_INGEST = True
+
+# spaCy pipeline (package name or path) for extract_instruments; only
+# its named entity recognizer is used
+NEWS_SPACY_MODEL = os.getenv('NEWS_SPACY_MODEL', 'en_core_web_sm')
+
+# Client and model for the enrich_news command (news.enrichment)
+NEWS_ENRICHMENT_CLIENT = 'news.enrichment.OpenAIEnrichmentClient'
+NEWS_ENRICHMENT_MODEL = 'gpt-4o-mini'
+# USD per million (prompt, completion) tokens, for EnrichmentRun.cost
+NEWS_ENRICHMENT_PRICES = {
+    'gpt-4o-mini': ('0.15', '0.60'),
+}
+
+# Seconds a cached API result is kept (CachedResultMixin)
+RESULT_CACHE_TIMEOUT = 300
+# Seconds the last result per request is kept to serve while recomputing
+RESULT_CACHE_STALE_TIMEOUT = 60 * 60
+# Seconds one worker holds the recompute lock, and a waiting worker polls
+RESULT_CACHE_LOCK_TIMEOUT = 10
+RESULT_CACHE_WAIT = 2
+# Recompute on a background thread while the stale result is served
+RESULT_CACHE_BACKGROUND_REFRESH = True
+
 
 
 
@@ -25,6 +25,7 @@ from rest_framework_simplejwt.views import (
 #from oauth2_provider import urls as oauth2_urls
 from django.conf import settings
 from django.conf.urls.static import static
+from .views import CacheStatsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -38,6 +39,7 @@ urlpatterns = [
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
+    path('api/cache-stats/', CacheStatsView.as_view(), name='cache_stats'),
     #path('o/', include(oauth2_urls)),
 ]
 
@@ -0,0 +1,16 @@
+# financial_social_media/views.py
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .caching import result_cache_stats
+
+
+class CacheStatsView(APIView):
+    """
+    Result cache hits and misses per view, for staff.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(result_cache_stats())
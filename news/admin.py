@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import NewsArticle
+from .models import EnrichmentRun, Instrument, NewsArticle, NewsFeed
 
 class NewsArticleAdmin(admin.ModelAdmin):
     list_display = ('title', 'source', 'published_at', 'sentiment')
@@ -17,4 +17,27 @@ class NewsArticleAdmin(admin.ModelAdmin):
         return ', '.join(obj.tags)
     formatted_tags.short_description = 'Tags'
 
-admin.site.register(NewsArticle, NewsArticleAdmin)
\ No newline at end of file
+admin.site.register(NewsArticle, NewsArticleAdmin)
+
+class NewsFeedAdmin(admin.ModelAdmin):
+    list_display = ('url', 'source', 'active', 'last_fetched_at', 'last_status')
+    list_filter = ('active',)
+    search_fields = ('url', 'source')
+    readonly_fields = ('etag', 'last_modified', 'last_fetched_at', 'last_status', 'last_error')
+
+admin.site.register(NewsFeed, NewsFeedAdmin)
+
+class EnrichmentRunAdmin(admin.ModelAdmin):
+    list_display = (
+        'started_at', 'client', 'model', 'articles_enriched', 'articles_failed',
+        'prompt_tokens', 'completion_tokens', 'cost',
+    )
+    list_filter = ('client', 'model')
+
+admin.site.register(EnrichmentRun, EnrichmentRunAdmin)
+
+class InstrumentAdmin(admin.ModelAdmin):
+    list_display = ('symbol', 'name', 'exchange')
+    search_fields = ('symbol', 'name')
+
+admin.site.register(Instrument, InstrumentAdmin)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class NewsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'news'
+
+    def ready(self):
+        from financial_social_media.caching import track_changes
+        track_changes('news.NewsArticle', 'news.ArticleInstrument')
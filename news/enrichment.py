@@ -0,0 +1,302 @@
+# apps/news/enrichment.py
+"""
+Batch enrichment of articles with an AI summary and a sentiment.
+
+`enrich_articles` selects articles missing either, sends them in batches
+to a client with at most `concurrency` batches in flight, retries
+transient failures with exponential backoff, and writes the results back
+with filtered updates, filling only the fields that are still empty when
+the results arrive. Every run is recorded as an EnrichmentRun with the
+token usage and cost of every attempt, failed ones included.
+
+Clients implement `enrich(articles)`. The OpenAI client is the default
+(NEWS_ENRICHMENT_CLIENT); StubEnrichmentClient is deterministic and
+offline, for tests and for benchmarking the pipeline itself.
+"""
+import json
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, CharField, Q, Value, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from financial_social_media.caching import bump_version
+from .models import EnrichmentRun, NewsArticle
+
+SENTIMENTS = [choice for choice, _ in NewsArticle.SENTIMENT_CHOICES]
+
+
+class TransientEnrichmentError(Exception):
+    """
+    A failure worth retrying, e.g. a rate limit or a timeout. Clients
+    set the tokens a failed call was still billed for, if any.
+    """
+    def __init__(self, *args, prompt_tokens=0, completion_tokens=0):
+        super().__init__(*args)
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+@dataclass
+class Enrichment:
+    article_id: int
+    summary: str
+    sentiment: str
+
+
+@dataclass
+class BatchResult:
+    enrichments: list
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+@dataclass
+class BatchUsage:
+    """
+    What all attempts at one batch used, whether or not it succeeded.
+    """
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    retries: int = 0
+
+    def add(self, billed):
+        self.prompt_tokens += getattr(billed, 'prompt_tokens', 0)
+        self.completion_tokens += getattr(billed, 'completion_tokens', 0)
+
+
+class EnrichmentClient(ABC):
+    model = ''
+    # Exceptions retried with backoff; anything else fails the batch
+    retryable_errors = (TransientEnrichmentError,)
+
+    @abstractmethod
+    def enrich(self, articles):
+        """
+        Summarize and classify `articles`. Returns a BatchResult with an
+        Enrichment per article it could handle.
+        """
+
+
+class StubEnrichmentClient(EnrichmentClient):
+    """
+    Offline client: the summary is the opening of the content, sentiment
+    comes from counting a few finance words, and tokens are words. Set
+    `latency` to stand in for network time when benchmarking.
+    """
+    model = 'stub'
+    positive = {'gain', 'gains', 'rise', 'rises', 'rose', 'rally', 'beat', 'growth', 'record', 'surge'}
+    negative = {'fall', 'falls', 'fell', 'slid', 'slide', 'slump', 'loss', 'losses', 'miss', 'cut', 'crash'}
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def enrich(self, articles):
+        if self.latency:
+            time.sleep(self.latency)
+        result = BatchResult(enrichments=[])
+        for article in articles:
+            words = re.findall(r'\w+', article.content.lower())
+            score = sum(word in self.positive for word in words) - sum(word in self.negative for word in words)
+            sentiment = 'positive' if score > 0 else 'negative' if score < 0 else 'neutral'
+            summary = ' '.join(article.content.split()[:40])
+            result.enrichments.append(Enrichment(article.pk, summary, sentiment))
+            result.prompt_tokens += len(words) + len(article.title.split())
+            result.completion_tokens += len(summary.split()) + 1
+        return result
+
+
+class OpenAIEnrichmentClient(EnrichmentClient):
+    """
+    Chat completions with a JSON response covering the whole batch. The
+    API key comes from OPENAI_API_KEY.
+    """
+    instructions = (
+        'For each news article, write a two-sentence summary for investors and classify its '
+        'market sentiment as positive, negative or neutral. Reply with a JSON object '
+        '{"articles": [{"id": ..., "summary": ..., "sentiment": ...}]}.'
+    )
+    max_content_chars = 4000
+
+    def __init__(self, model=None):
+        import openai
+
+        self.model = model or getattr(settings, 'NEWS_ENRICHMENT_MODEL', 'gpt-4o-mini')
+        # Retries are ours, with backoff shared across the pool
+        self.client = openai.OpenAI(max_retries=0)
+        self.retryable_errors = (
+            openai.RateLimitError, openai.APITimeoutError,
+            openai.APIConnectionError, openai.InternalServerError,
+        )
+
+    def enrich(self, articles):
+        payload = [
+            {'id': article.pk, 'title': article.title, 'content': article.content[:self.max_content_chars]}
+            for article in articles
+        ]
+        response = self.client.chat.completions.create(
+            model=self.model,
+            response_format={'type': 'json_object'},
+            messages=[
+                {'role': 'system', 'content': self.instructions},
+                {'role': 'user', 'content': json.dumps(payload)},
+            ],
+        )
+        ids = {article.pk for article in articles}
+        try:
+            items = json.loads(response.choices[0].message.content)['articles']
+        except (ValueError, KeyError, TypeError):
+            items = []
+        enrichments = [
+            Enrichment(item['id'], str(item.get('summary', '')).strip(), item.get('sentiment'))
+            for item in items
+            if isinstance(item, dict) and item.get('id') in ids and item.get('sentiment') in SENTIMENTS
+        ]
+        return BatchResult(
+            enrichments=enrichments,
+            prompt_tokens=response.usage.prompt_tokens,
+            completion_tokens=response.usage.completion_tokens,
+        )
+
+
+def get_enrichment_client(path=None):
+    path = path or getattr(settings, 'NEWS_ENRICHMENT_CLIENT', 'news.enrichment.OpenAIEnrichmentClient')
+    return import_string(path)()
+
+
+def get_cost(model, prompt_tokens, completion_tokens):
+    """
+    Cost in USD from NEWS_ENRICHMENT_PRICES, per million tokens.
+    """
+    prices = getattr(settings, 'NEWS_ENRICHMENT_PRICES', {}).get(model)
+    if prices is None:
+        return Decimal(0)
+    prompt_price, completion_price = (Decimal(str(price)) for price in prices)
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def call_with_retries(client, batch, usage, max_retries, backoff, sleep=time.sleep):
+    """
+    Returns the BatchResult; raises once retries run out. The tokens and
+    retries of every attempt are added to `usage`.
+    """
+    for attempt in range(max_retries + 1):
+        usage.retries = attempt
+        try:
+            result = client.enrich(batch)
+        except Exception as exc:
+            usage.add(exc)
+            if not isinstance(exc, client.retryable_errors) or attempt == max_retries:
+                raise
+            # Full jitter, so throttled workers don't retry in lockstep
+            sleep(random.uniform(0, backoff * 2 ** attempt))
+            continue
+        usage.add(result)
+        return result
+
+
+def articles_to_enrich():
+    return NewsArticle.objects.filter(Q(ai_summary='') | Q(sentiment__isnull=True))
+
+
+def enrich_articles(client, limit=None, batch_size=20, concurrency=4, max_retries=3,
+                    backoff=1.0, sleep=time.sleep):
+    """
+    Enrich up to `limit` articles missing a summary or sentiment, newest
+    first, and return the EnrichmentRun recording it.
+    """
+    run = EnrichmentRun.objects.create(client=type(client).__name__, model=client.model)
+    articles = articles_to_enrich().only(
+        'id', 'title', 'content', 'ai_summary', 'sentiment', 'sentiment_source',
+    )
+    # Enough batches per window to keep every worker busy
+    window = batch_size * concurrency * 4
+    last_id = None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while limit is None or run.articles_selected < limit:
+            size = window if limit is None else min(window, limit - run.articles_selected)
+            page = articles.order_by('-id')
+            if last_id is not None:
+                page = page.filter(id__lt=last_id)
+            page = list(page[:size])
+            if not page:
+                break
+            last_id = page[-1].pk
+            run.articles_selected += len(page)
+            enrich_window(client, run, page, pool, batch_size, max_retries, backoff, sleep)
+
+    run.finished_at = timezone.now()
+    run.cost = get_cost(client.model, run.prompt_tokens, run.completion_tokens)
+    run.save()
+    return run
+
+
+def enrich_window(client, run, articles, pool, batch_size, max_retries, backoff, sleep):
+    by_id = {article.pk: article for article in articles}
+    batches = [articles[i:i + batch_size] for i in range(0, len(articles), batch_size)]
+    futures = {}
+    for batch in batches:
+        usage = BatchUsage()
+        future = pool.submit(call_with_retries, client, batch, usage, max_retries, backoff, sleep)
+        futures[future] = usage
+    summaries, sentiments, enriched = {}, {}, set()
+    for future in as_completed(futures):
+        usage = futures[future]
+        run.batches += 1
+        run.retries += usage.retries
+        run.prompt_tokens += usage.prompt_tokens
+        run.completion_tokens += usage.completion_tokens
+        try:
+            result = future.result()
+        except Exception as exc:
+            run.batches_failed += 1
+            run.last_error = f'{type(exc).__name__}: {exc}'
+            continue
+        for enrichment in result.enrichments:
+            article = by_id.get(enrichment.article_id)
+            if article is None:
+                continue
+            if not article.ai_summary:
+                summaries[article.pk] = enrichment.summary
+            if article.sentiment is None:
+                sentiments[article.pk] = enrichment.sentiment
+            enriched.add(article.pk)
+
+    run.articles_enriched += len(enriched)
+    run.articles_failed += len(articles) - len(enriched)
+    with transaction.atomic():
+        # Filtered on the current values, so whatever an editor wrote
+        # since the articles were selected stays
+        write_missing(summaries, 'ai_summary', Q(ai_summary=''))
+        write_missing(sentiments, 'sentiment', Q(sentiment__isnull=True), sentiment_source='llm')
+        # .update() sends no post_save signals
+        bump_version(NewsArticle._meta.label)
+        run.save()
+
+
+def write_missing(values, field, missing, batch_size=500, **extra):
+    """
+    Set `field` to `values[pk]` on the articles still matching `missing`.
+    Returns the number of articles written.
+    """
+    ids = list(values)
+    written = 0
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        written += NewsArticle.objects.filter(missing, pk__in=chunk).update(
+            **{field: Case(
+                *(When(pk=pk, then=Value(values[pk])) for pk in chunk),
+                output_field=CharField(),
+            )},
+            **extra,
+        )
+    return written
@@ -0,0 +1,122 @@
+# apps/news/entities.py
+"""
+Instrument extraction for news articles.
+
+spaCy's `nlp.pipe` finds ORG entities in the title and content of a
+batch of articles, optionally across several processes. Together with
+ticker mentions ("$TSLA", "NASDAQ: AAPL") they are matched against the
+Instrument table, and the matches are stored as ArticleInstrument links.
+The pipeline comes from NEWS_SPACY_MODEL, a package name or a path.
+"""
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from financial_social_media.caching import bump_version
+from .models import ArticleInstrument, Instrument, NewsArticle
+
+# Components NER doesn't need; missing ones are ignored by spacy.load
+UNUSED_COMPONENTS = ['tagger', 'parser', 'attribute_ruler', 'lemmatizer', 'senter']
+CASHTAG = re.compile(r'(?<![\w$])\$([A-Za-z]{1,5}(?:\.[A-Za-z]{1,2})?)\b')
+EXCHANGE_TICKER = re.compile(
+    r'\b(?:NYSE|NASDAQ|Nasdaq|AMEX|LSE|TSX|NYSEARCA)\s*:\s*([A-Z]{1,5}(?:\.[A-Z]{1,2})?)\b'
+)
+LEGAL_SUFFIXES = {
+    'inc', 'incorporated', 'corp', 'corporation', 'co', 'company', 'ltd', 'limited',
+    'plc', 'llc', 'lp', 'sa', 'ag', 'nv', 'se', 'holdings', 'group',
+}
+_word = re.compile(r'[a-z0-9&]+')
+
+_pipelines = {}
+
+
+def get_nlp():
+    """
+    The NEWS_SPACY_MODEL pipeline, loaded once per process.
+    """
+    name = getattr(settings, 'NEWS_SPACY_MODEL', 'en_core_web_sm')
+    if name not in _pipelines:
+        import spacy
+
+        _pipelines[name] = spacy.load(name, disable=UNUSED_COMPONENTS)
+    return _pipelines[name]
+
+
+def normalize_org(name):
+    """
+    'The Tesla, Inc.' and 'Tesla' both become 'tesla'.
+    """
+    words = _word.findall(name.lower().replace("'s", ''))
+    if words and words[0] == 'the':
+        words = words[1:]
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+
+def find_tickers(text):
+    return [match.upper() for match in CASHTAG.findall(text)] + EXCHANGE_TICKER.findall(text)
+
+
+class InstrumentMatcher:
+    """
+    The Instrument table as lookups by symbol and normalized name.
+    """
+    def __init__(self, instruments=None):
+        instruments = Instrument.objects.all() if instruments is None else instruments
+        self.by_symbol, self.by_name = {}, {}
+        for instrument in instruments:
+            self.by_symbol[instrument.symbol] = instrument.pk
+            for name in [instrument.name, *instrument.aliases]:
+                self.by_name.setdefault(normalize_org(name), instrument.pk)
+
+    def match(self, orgs, tickers):
+        """
+        Return `{instrument_id: mentions}`.
+        """
+        found = Counter()
+        for org in orgs:
+            instrument_id = self.by_name.get(normalize_org(org))
+            if instrument_id is not None:
+                found[instrument_id] += 1
+        for ticker in tickers:
+            instrument_id = self.by_symbol.get(ticker)
+            if instrument_id is not None:
+                found[instrument_id] += 1
+        return found
+
+
+def extract_instruments(articles, matcher=None, nlp=None, batch_size=64, n_process=1):
+    """
+    Replace the instrument links of `articles` with what their text
+    mentions now. Returns the number of links written.
+    """
+    if not articles:
+        return 0
+    matcher = matcher or InstrumentMatcher()
+    nlp = nlp or get_nlp()
+    max_chars = getattr(settings, 'NEWS_SPACY_MAX_CHARS', 10000)
+    texts = [f'{article.title}\n{article.content[:max_chars]}' for article in articles]
+
+    links = []
+    docs = nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+    for article, doc in zip(articles, docs):
+        orgs = [ent.text for ent in doc.ents if ent.label_ == 'ORG']
+        for instrument_id, mentions in matcher.match(orgs, find_tickers(doc.text)).items():
+            links.append(ArticleInstrument(
+                article=article, instrument_id=instrument_id,
+                mentions=min(mentions, 32767), published_at=article.published_at,
+            ))
+
+    with transaction.atomic():
+        ArticleInstrument.objects.filter(article__in=articles).delete()
+        ArticleInstrument.objects.bulk_create(links, batch_size=5000)
+        NewsArticle.objects.filter(pk__in=[article.pk for article in articles]).update(
+            instruments_extracted_at=timezone.now(),
+        )
+        # bulk writes send no post_save signals
+        bump_version(ArticleInstrument._meta.label)
+    return len(links)
@@ -0,0 +1,68 @@
+# apps/news/feed_parsing.py
+"""
+Feed parsing for news.feeds, run in worker processes.
+
+Nothing here touches Django models or settings, so workers need no
+Django setup and work under any start method (spawn, forkserver or
+fork). Field lengths come from the parent as plain data.
+"""
+import calendar
+from datetime import datetime, timezone
+
+import feedparser
+from bs4 import BeautifulSoup
+
+from .utils import normalize_url
+
+
+def clean_html(html):
+    """
+    Text content of an HTML fragment, with whitespace collapsed.
+    """
+    if not html:
+        return ''
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(['script', 'style', 'iframe', 'noscript']):
+        tag.decompose()
+    return ' '.join(soup.get_text(' ').split())
+
+
+def _entry_time(entry):
+    parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+    if parsed is None:
+        return None
+    return datetime.fromtimestamp(calendar.timegm(parsed), tz=timezone.utc)
+
+
+def parse_feed(body, source, limits):
+    """
+    Turn a feed document into NewsArticle field dicts. `limits` maps
+    field names (title, source, original_url, normalized_url) to their
+    max_length; titles and sources are cut to fit, entries whose URL
+    doesn't fit are skipped. Undated entries have no `published_at`, so
+    re-polling them keeps the stored date.
+    """
+    parsed = feedparser.parse(body)
+    source = source or parsed.feed.get('title', '')
+    articles = []
+    for entry in parsed.entries:
+        link = entry.get('link', '').strip()
+        title = clean_html(entry.get('title', ''))
+        if not link or not title or len(link) > limits['original_url']:
+            continue
+        if len(normalize_url(link)) > limits['normalized_url']:
+            continue
+        content = entry.get('content')
+        html = content[0].get('value', '') if content else entry.get('summary', '')
+        article = {
+            'title': title[:limits['title']],
+            'source': source[:limits['source']],
+            'original_url': link,
+            'content': clean_html(html),
+            'tags': [tag['term'] for tag in entry.get('tags', []) if tag.get('term')],
+        }
+        published_at = _entry_time(entry)
+        if published_at is not None:
+            article['published_at'] = published_at
+        articles.append(article)
+    return articles
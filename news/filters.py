@@ -1,5 +1,7 @@
 # apps/news/filters.py
 import django_filters
+from django.db.models import Q
+from rest_framework.filters import SearchFilter
 from .models import NewsArticle
 
 class NewsArticleFilter(django_filters.FilterSet):
@@ -10,6 +12,10 @@ class NewsArticleFilter(django_filters.FilterSet):
     tags = django_filters.CharFilter(method='filter_tags')
     date_from = django_filters.DateTimeFilter(field_name='published_at', lookup_expr='gte')
     date_to = django_filters.DateTimeFilter(field_name='published_at', lookup_expr='lte')
+    # $TSLA or TSLA; served by the instrument link index
+    instrument = django_filters.CharFilter(method='filter_instrument')
+    # duplicates=false collapses each near-duplicate cluster to its first article
+    duplicates = django_filters.BooleanFilter(field_name='duplicate_of', lookup_expr='isnull', exclude=True)
 
     class Meta:
         model = NewsArticle
@@ -20,11 +26,47 @@ class NewsArticleFilter(django_filters.FilterSet):
             'category', 
             'tags', 
             'date_from', 
-            'date_to'
+            'date_to',
+            'duplicates',
+            'instrument',
         ]
 
     def filter_category(self, queryset, name, value):
         return queryset.filter(categories__contains=[value])
 
     def filter_tags(self, queryset, name, value):
-        return queryset.filter(tags__contains=[value])
\ No newline at end of file
+        return queryset.filter(tags__contains=[value])
+
+    def filter_instrument(self, queryset, name, value):
+        return queryset.filter(instrument_links__instrument__symbol=value.lstrip('$').upper())
+
+
+class NewsArticleSearchFilter(SearchFilter):
+    """
+    SearchFilter that matches JSON array fields such as `tags` by element
+    (`tags @> '["term"]'`, served by the GIN index) instead of running
+    icontains over their serialized text.
+    """
+    array_fields = ('tags', 'categories')
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+        if not search_fields or not search_terms:
+            return queryset
+
+        text_lookups = [
+            self.construct_search(str(field), queryset)
+            for field in search_fields if field not in self.array_fields
+        ]
+        array_fields = [field for field in search_fields if field in self.array_fields]
+
+        # Every term must match at least one field, as in SearchFilter
+        for term in search_terms:
+            condition = Q()
+            for lookup in text_lookups:
+                condition |= Q(**{lookup: term})
+            for field in array_fields:
+                condition |= Q(**{f'{field}__contains': [term]})
+            queryset = queryset.filter(condition)
+        return queryset
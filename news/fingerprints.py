@@ -0,0 +1,100 @@
+# apps/news/fingerprints.py
+"""
+MinHash fingerprints for near-duplicate detection.
+
+An article's signature holds, for each of PERMUTATIONS hash functions,
+the minimum hash over the word 3-shingles of its title and content. The
+share of equal positions in two signatures estimates the Jaccard
+similarity of the texts, so the same wire story with small edits scores
+close to 1. For lookups a signature is cut into BANDS bands of ROWS
+values, each reduced to one 64-bit key and stored as a row of
+NewsFingerprintBand: texts at similarity s share at least one key with
+probability 1 - (1 - s**ROWS)**BANDS, about 0.99 at s = 0.8 and 0.01 at
+s = 0.3, and only the candidates sharing a key are compared in full.
+"""
+import re
+from hashlib import blake2b
+
+import numpy as np
+
+SHINGLE_SIZE = 3
+# Shorter texts have too few shingles for a meaningful signature
+MIN_SHINGLES = 8
+BANDS = 20
+ROWS = 6
+PERMUTATIONS = BANDS * ROWS
+
+# Multiply-shift hashing: the high 32 bits of (a * x + b) mod 2**64,
+# with a odd, are a universal family with no division
+_random = np.random.default_rng(20241018)
+_A = _random.integers(0, 1 << 63, PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _random.integers(0, 1 << 63, PERMUTATIONS, dtype=np.uint64)
+# Per-row multipliers folding a band's values into one key
+_FOLD = _random.integers(1, 1 << 63, ROWS, dtype=np.uint64) | np.uint64(1)
+
+_word = re.compile(r'\w+')
+
+
+def shingle_hashes(text):
+    words = _word.findall(text.lower())
+    shingles = {
+        ' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+    return [
+        int.from_bytes(blake2b(shingle.encode(), digest_size=4).digest(), 'little')
+        for shingle in shingles
+    ]
+
+
+def minhash_many(texts):
+    """
+    Sign many texts at once. Returns a uint32 array of PERMUTATIONS
+    values per text, or None for texts too short to sign.
+    """
+    hashes, starts, signed = [], [], []
+    for index, text in enumerate(texts):
+        text_hashes = shingle_hashes(text)
+        if len(text_hashes) < MIN_SHINGLES:
+            continue
+        starts.append(len(hashes))
+        signed.append(index)
+        hashes.extend(text_hashes)
+
+    results = [None] * len(texts)
+    if not signed:
+        return results
+    # One row per shingle, one column per hash function (uint64 wraps)
+    x = np.array(hashes, dtype=np.uint64)[:, None]
+    permuted = ((x * _A + _B) >> np.uint64(32)).astype(np.uint32)
+    signatures = np.minimum.reduceat(permuted, starts, axis=0)
+    for index, signature in zip(signed, signatures):
+        results[index] = signature
+    return results
+
+
+def article_text(title, content):
+    return f'{title}\n{content}'
+
+
+def band_keys(signature):
+    """
+    Return the signed 64-bit key of each band, in band order.
+    """
+    rows = signature.astype(np.uint64).reshape(BANDS, ROWS)
+    keys = (rows * _FOLD).sum(axis=1, dtype=np.uint64)
+    return keys.view(np.int64).tolist()
+
+
+def to_bytes(signature):
+    return signature.astype('<u4').tobytes()
+
+
+def from_bytes(data):
+    return np.frombuffer(bytes(data), dtype='<u4')
+
+
+def similarity(a, b):
+    """
+    Estimated Jaccard similarity of two signatures.
+    """
+    return float(np.mean(a == b))
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from news.enrichment import enrich_articles, get_enrichment_client
+
+
+class Command(BaseCommand):
+    help = 'Fill in missing AI summaries and sentiments of news articles'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--client',
+            help='Dotted path of the enrichment client (default: NEWS_ENRICHMENT_CLIENT)',
+        )
+        parser.add_argument(
+            '--limit', type=int,
+            help='Enrich at most this many articles (default: all missing)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=20,
+            help='Articles per client call (default: 20)',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Client calls in flight at once (default: 4)',
+        )
+        parser.add_argument(
+            '--max-retries', type=int, default=3,
+            help='Retries of a batch after a transient error (default: 3)',
+        )
+        parser.add_argument(
+            '--backoff', type=float, default=1.0,
+            help='Base delay in seconds before the first retry, doubled after each (default: 1)',
+        )
+
+    def handle(self, *args, **options):
+        client = get_enrichment_client(options['client'])
+        started = time.monotonic()
+        run = enrich_articles(
+            client,
+            limit=options['limit'],
+            batch_size=options['batch_size'],
+            concurrency=options['concurrency'],
+            max_retries=options['max_retries'],
+            backoff=options['backoff'],
+        )
+        elapsed = time.monotonic() - started
+
+        if run.last_error:
+            self.stderr.write(f'{run.batches_failed} of {run.batches} batches failed, last: {run.last_error}')
+        rate = run.articles_enriched / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Enriched {run.articles_enriched} of {run.articles_selected} articles '
+            f'in {elapsed:.1f}s ({rate:.0f}/s), {run.retries} retries, '
+            f'{run.prompt_tokens + run.completion_tokens} tokens, ${run.cost:.4f}'
+        ))
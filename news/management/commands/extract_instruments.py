@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from news.entities import InstrumentMatcher, extract_instruments, get_nlp
+from news.models import NewsArticle
+
+
+class Command(BaseCommand):
+    help = 'Link news articles to the instruments they mention'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Articles read and linked per batch (default: 2000)',
+        )
+        parser.add_argument(
+            '--pipe-batch-size', type=int, default=64,
+            help='Texts per nlp.pipe batch (default: 64)',
+        )
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Processes running the spaCy pipeline (default: 1)',
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Re-extract every article, not only those never processed',
+        )
+
+    def handle(self, *args, **options):
+        articles = NewsArticle.objects.only('id', 'title', 'content', 'published_at')
+        if not options['all']:
+            articles = articles.filter(instruments_extracted_at__isnull=True)
+        matcher, nlp = InstrumentMatcher(), get_nlp()
+
+        started = time.monotonic()
+        last_id, done, links = 0, 0, 0
+        while True:
+            batch = list(articles.filter(id__gt=last_id).order_by('id')[:options['batch_size']])
+            if not batch:
+                break
+            links += extract_instruments(
+                batch, matcher=matcher, nlp=nlp,
+                batch_size=options['pipe_batch_size'], n_process=options['processes'],
+            )
+            done += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'Processed {done} articles', ending='\r')
+
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {done} articles ({rate:.0f}/s), {links} instrument links'
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from news.models import NewsArticle
+
+
+class Command(BaseCommand):
+    help = 'Compute MinHash fingerprints and near-duplicate clusters for stored articles'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Articles fingerprinted per batch (default: 5000)',
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Recompute every article, not only those without a fingerprint',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        articles = NewsArticle.objects.only('id', 'title', 'content', 'published_at', 'duplicate_of')
+        if not options['all']:
+            articles = articles.filter(minhash__isnull=True)
+
+        # Walked in id order, so clusters point at their earliest article
+        last_id, done, duplicates = 0, 0, 0
+        while True:
+            batch = list(articles.filter(id__gt=last_id).order_by('id')[:batch_size])
+            if not batch:
+                break
+            duplicates += NewsArticle.objects.fingerprint(batch)
+            done += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'Fingerprinted {done} articles', ending='\r')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Fingerprinted {done} articles, {duplicates} near-duplicates'
+        ))
@@ -0,0 +1,66 @@
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from news.feeds import ingest_feeds
+from news.models import NewsFeed
+
+
+class Command(BaseCommand):
+    help = 'Fetch the active news feeds and ingest their articles'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--feed', action='append', dest='feeds', default=[],
+            help='Only fetch this feed URL; repeatable',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=20,
+            help='Feeds fetched at once (default: 20)',
+        )
+        parser.add_argument(
+            '--per-host', type=int, default=2,
+            help='Connections per host (default: 2)',
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=20,
+            help='Seconds allowed per feed (default: 20)',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Processes parsing feeds (default: one per CPU)',
+        )
+
+    def handle(self, *args, **options):
+        feeds = NewsFeed.objects.filter(active=True).order_by('id')
+        if options['feeds']:
+            feeds = feeds.filter(url__in=options['feeds'])
+        feeds = list(feeds)
+        if not feeds:
+            self.stdout.write('No feeds to fetch')
+            return
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            results, written = ingest_feeds(
+                feeds,
+                executor=executor,
+                concurrency=options['concurrency'],
+                per_host=options['per_host'],
+                timeout=options['timeout'],
+            )
+
+        for result in results:
+            if result.error:
+                self.stderr.write(f'{result.feed.url}: {result.error}')
+            elif result.unchanged:
+                self.stdout.write(f'{result.feed.url}: not modified')
+            else:
+                self.stdout.write(f'{result.feed.url}: {len(result.articles)} articles')
+
+        statuses = Counter(status for _, status in written)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(results)} feeds: {statuses["created"]} articles created, '
+            f'{statuses["updated"]} updated, {statuses["duplicate"]} duplicates'
+        ))
@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from financial_social_media.caching import bump_version
+from news.enrichment import write_missing
+from news.fingerprints import article_text
+from news.models import NewsArticle
+from news.sentiment import CLASSIFIER_SOURCE, load_model, predict
+
+
+class Command(BaseCommand):
+    help = 'Classify the sentiment of stored articles with the local model'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Articles scored per predict call (default: 10000)',
+        )
+        parser.add_argument(
+            '--rescore', action='store_true',
+            help='Also replace sentiments the classifier set before',
+        )
+
+    def handle(self, *args, **options):
+        bundle = load_model()
+        if bundle is None:
+            raise CommandError('No sentiment model; run train_news_sentiment first.')
+
+        # Every article is scored: unlabelled ones get the prediction, and
+        # labelled ones measure agreement with their existing label
+        articles = NewsArticle.objects.only('id', 'title', 'content', 'sentiment', 'sentiment_source')
+        rescore = options['rescore']
+        # Checked again when writing, so a label an editor saved while the
+        # batch was being scored stays
+        replaceable = Q(sentiment__isnull=True)
+        if rescore:
+            replaceable |= Q(sentiment_source=CLASSIFIER_SOURCE)
+        last_id, scored, written, labelled, agreed = 0, 0, 0, 0, 0
+        scoring_time = 0.0
+        while True:
+            batch = list(articles.filter(id__gt=last_id).order_by('id')[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            started = time.monotonic()
+            labels = predict(bundle, [article_text(a.title, a.content) for a in batch])
+            scoring_time += time.monotonic() - started
+            scored += len(batch)
+
+            changed = {}
+            for article, label in zip(batch, labels):
+                predicted = article.sentiment_source == CLASSIFIER_SOURCE
+                if article.sentiment is None or (rescore and predicted):
+                    if (article.sentiment, article.sentiment_source) != (label, CLASSIFIER_SOURCE):
+                        changed[article.pk] = label
+                elif not predicted:
+                    labelled += 1
+                    agreed += article.sentiment == label
+            if changed:
+                with transaction.atomic():
+                    written += write_missing(
+                        changed, 'sentiment', replaceable, sentiment_source=CLASSIFIER_SOURCE,
+                    )
+                    # .update() sends no post_save signals
+                    bump_version(NewsArticle._meta.label)
+            self.stdout.write(f'Scored {scored} articles', ending='\r')
+
+        rate = scored / scoring_time if scoring_time else 0
+        agreement = f'{agreed / labelled:.1%} of {labelled} labelled' if labelled else 'no labelled articles'
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {scored} articles ({rate:.0f}/s), wrote {written}, agreement {agreement}'
+        ))
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from news.fingerprints import article_text
+from news.models import NewsArticle
+from news.sentiment import CLASSIFIER_SOURCE, get_model_path, save_model, train
+
+
+class Command(BaseCommand):
+    help = 'Train the local news sentiment classifier from labelled articles'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--holdout', type=float, default=0.2,
+            help='Share of labelled articles held out to measure agreement (default: 0.2)',
+        )
+        parser.add_argument(
+            '--path',
+            help='Where to save the model (default: NEWS_SENTIMENT_MODEL_PATH)',
+        )
+
+    def handle(self, *args, **options):
+        rows = (
+            NewsArticle.objects
+            .filter(sentiment__isnull=False)
+            .exclude(sentiment_source=CLASSIFIER_SOURCE)
+            .values_list('title', 'content', 'sentiment')
+            .iterator(chunk_size=10000)
+        )
+        texts, labels = [], []
+        for title, content, sentiment in rows:
+            texts.append(article_text(title, content))
+            labels.append(sentiment)
+
+        started = time.monotonic()
+        try:
+            bundle = train(texts, labels, holdout=options['holdout'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        path = options['path'] or get_model_path()
+        save_model(bundle, path)
+
+        agreement = bundle['holdout_agreement']
+        agreement = 'not measured' if agreement is None else f'{agreement:.1%}'
+        self.stdout.write(self.style.SUCCESS(
+            f'Trained on {bundle["samples"]} articles in {time.monotonic() - started:.1f}s, '
+            f'holdout agreement {agreement}, saved to {path}'
+        ))
@@ -0,0 +1,170 @@
+# apps/news/managers.py
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from financial_social_media.caching import bump_version
+from .fingerprints import article_text, band_keys, from_bytes, minhash_many, similarity, to_bytes
+from .utils import normalize_url
+
+
+class NewsArticleManager(models.Manager):
+    # Columns a re-ingested article overwrites, when the item sends them;
+    # a missing key keeps the stored value (e.g. categories editors
+    # added). Enrichment output (ai_summary, sentiment) is left alone,
+    # since scrapers send it blank; new articles without a sentiment get
+    # one from the local classifier.
+    ingest_update_fields = [
+        'title', 'source', 'original_url', 'published_at', 'content', 'categories', 'tags',
+    ]
+    # Reset on every re-ingest, so extract_instruments picks the new text up
+    ingest_reset_fields = ['instruments_extracted_at']
+
+    def bulk_ingest(self, articles):
+        """
+        Insert or update many articles, given as dicts of field values,
+        keyed by their normalized URL. A URL repeated in `articles` is
+        written once with its last values. An update only overwrites the
+        fields its dict contains; without `published_at` an article keeps
+        its stored date, or is dated now when new.
+
+        Returns one `(article, status)` per input, status being 'created',
+        'updated' or 'duplicate' (collapsed into a later entry). Whether a
+        row was created is read before writing, so it is only indicative
+        when two ingests race on the same URL.
+        """
+        if not articles:
+            return []
+        batch_size = getattr(settings, 'NEWS_INGEST_BATCH_SIZE', 1000)
+        keys = [normalize_url(fields['original_url']) for fields in articles]
+        last = {key: index for index, key in enumerate(keys)}
+
+        # normalized_url: stored published_at
+        existing = {}
+        urls = list(last)
+        for start in range(0, len(urls), batch_size):
+            existing.update(self.filter(
+                normalized_url__in=urls[start:start + batch_size],
+            ).values_list('normalized_url', 'published_at'))
+
+        now = timezone.now()
+        latest = {}
+        for key, index in last.items():
+            fields = articles[index]
+            if 'published_at' not in fields:
+                # Not in the upsert's update fields, so only used when new
+                # (and for the fingerprint window)
+                fields = {**fields, 'published_at': existing.get(key, now)}
+            latest[key] = self.model(**fields, normalized_url=key)
+
+        # Imported here: the classifier pulls in scikit-learn when it loads
+        from .sentiment import classify_missing
+        classify_missing(latest.values())
+
+        # One upsert per set of fields sent, usually just one
+        groups = {}
+        for key, article in latest.items():
+            groups.setdefault(frozenset(articles[last[key]]), []).append(article)
+
+        with transaction.atomic():
+            for sent, group in groups.items():
+                # Postgres returns the id of inserted and updated rows alike
+                self.bulk_create(
+                    group,
+                    batch_size=batch_size,
+                    update_conflicts=True,
+                    unique_fields=['normalized_url'],
+                    update_fields=[
+                        field for field in self.ingest_update_fields if field in sent
+                    ] + self.ingest_reset_fields,
+                )
+            self.fingerprint(latest.values())
+            # bulk_create sends no post_save signals
+            bump_version(self.model._meta.label)
+
+        results = []
+        for index, key in enumerate(keys):
+            if last[key] != index:
+                status = 'duplicate'
+            elif key in existing:
+                status = 'updated'
+            else:
+                status = 'created'
+            results.append((latest[key], status))
+        return results
+
+    def fingerprint(self, articles):
+        """
+        MinHash saved `articles`, replace their band rows and point each
+        one that is a near-duplicate of an earlier article published
+        within NEWS_DUPLICATE_WINDOW_HOURS at that article's cluster.
+        Returns the number of near-duplicates found.
+        """
+        articles = sorted(articles, key=lambda article: article.pk)
+        if not articles:
+            return 0
+        Band = apps.get_model('news', 'NewsFingerprintBand')
+        signatures = minhash_many([article_text(a.title, a.content) for a in articles])
+        rows = []
+        for article, signature in zip(articles, signatures):
+            article.signature = signature
+            article.minhash = None if signature is None else to_bytes(signature)
+            if signature is not None:
+                rows.extend(
+                    Band(article=article, band=band, value=key, published_at=article.published_at)
+                    for band, key in enumerate(band_keys(signature))
+                )
+
+        with transaction.atomic():
+            Band.objects.filter(article__in=articles).delete()
+            Band.objects.bulk_create(rows, batch_size=5000)
+            duplicates = self._cluster(articles, Band)
+            self.bulk_update(articles, ['minhash', 'duplicate_of'], batch_size=5000)
+            bump_version(self.model._meta.label)
+        return duplicates
+
+    def _cluster(self, articles, Band):
+        threshold = getattr(settings, 'NEWS_DUPLICATE_SIMILARITY', 0.7)
+        window = timedelta(hours=getattr(settings, 'NEWS_DUPLICATE_WINDOW_HOURS', 72))
+        band_table = Band._meta.db_table
+        # Earlier articles sharing a band key within the window; the
+        # (band, value, published_at) index answers each probe
+        sql = f"""
+            SELECT DISTINCT n.article_id, o.article_id, a.minhash, a.duplicate_of_id
+            FROM {band_table} AS n
+            JOIN {band_table} AS o
+              ON o.band = n.band AND o.value = n.value
+             AND o.published_at BETWEEN n.published_at - %s AND n.published_at + %s
+             AND o.article_id < n.article_id
+            JOIN {self.model._meta.db_table} AS a ON a.id = o.article_id
+            WHERE n.article_id = ANY(%s)
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [window, window, [article.pk for article in articles]])
+            matches = cursor.fetchall()
+
+        candidates = {}
+        for article_id, other_id, minhash, duplicate_of in matches:
+            candidates.setdefault(article_id, {})[other_id] = (minhash, duplicate_of)
+
+        # In id order, so earlier articles of this batch are already resolved
+        batch = {article.pk: article for article in articles}
+        duplicates = 0
+        for article in articles:
+            article.duplicate_of_id = None
+            if article.signature is None:
+                continue
+            for other_id in sorted(candidates.get(article.pk, ())):
+                if other_id in batch:
+                    signature, duplicate_of = batch[other_id].signature, batch[other_id].duplicate_of_id
+                else:
+                    minhash, duplicate_of = candidates[article.pk][other_id]
+                    signature = None if minhash is None else from_bytes(minhash)
+                if signature is not None and similarity(article.signature, signature) >= threshold:
+                    article.duplicate_of_id = duplicate_of or other_id
+                    duplicates += 1
+                    break
+        return duplicates
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:37
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('news', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='newsarticle',
+            index=models.Index(fields=['published_at', 'id'], name='news_published_id_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:42
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+BATCH_SIZE = 5000
+
+# Containment only matches JSON arrays: wrap bare strings in an array and
+# replace anything else (null, objects, numbers) with an empty one
+NORMALIZE_BATCH = """
+    UPDATE news_newsarticle
+    SET categories = CASE jsonb_typeof(categories)
+            WHEN 'array' THEN categories
+            WHEN 'string' THEN jsonb_build_array(categories)
+            ELSE '[]'::jsonb
+        END,
+        tags = CASE jsonb_typeof(tags)
+            WHEN 'array' THEN tags
+            WHEN 'string' THEN jsonb_build_array(tags)
+            ELSE '[]'::jsonb
+        END
+    WHERE id > %s AND id <= %s
+      AND (jsonb_typeof(categories) <> 'array' OR jsonb_typeof(tags) <> 'array')
+"""
+
+
+def normalize_json_arrays(apps, schema_editor):
+    """
+    Walk the table in primary-key ranges. The migration is non-atomic, so
+    each batch commits on its own and only locks the rows it rewrites.
+    """
+    NewsArticle = apps.get_model('news', 'NewsArticle')
+    last_id = NewsArticle.objects.order_by('-id').values_list('id', flat=True).first()
+    if last_id is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(0, last_id, BATCH_SIZE):
+            cursor.execute(NORMALIZE_BATCH, [start, start + BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('news', '0002_newsarticle_news_published_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_json_arrays, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='newsarticle',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['categories'], name='news_categories_gin_idx', opclasses=['jsonb_path_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='newsarticle',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tags'], name='news_tags_gin_idx', opclasses=['jsonb_path_ops']),
+        ),
+    ]
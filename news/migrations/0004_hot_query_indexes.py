@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:43
+
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('news', '0003_news_json_gin_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='newsarticle',
+            index=models.Index(fields=['sentiment', 'published_at', 'id'], name='news_sentiment_published_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='newsarticle',
+            index=models.Index(django.db.models.functions.text.Upper('source'), name='news_source_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:04
+
+from django.db import migrations, models
+
+from news.utils import normalize_url
+
+
+def backfill_normalized_urls(apps, schema_editor):
+    # The newest copy of a duplicated article gets the key; older copies
+    # stay NULL, which the unique constraint allows
+    NewsArticle = apps.get_model('news', 'NewsArticle')
+    seen = set()
+    batch = []
+    for article in NewsArticle.objects.only('id', 'original_url').order_by('-id').iterator(chunk_size=2000):
+        key = normalize_url(article.original_url)
+        if key in seen:
+            continue
+        seen.add(key)
+        article.normalized_url = key
+        batch.append(article)
+        if len(batch) >= 2000:
+            NewsArticle.objects.bulk_update(batch, ['normalized_url'])
+            batch = []
+    NewsArticle.objects.bulk_update(batch, ['normalized_url'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0004_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsarticle',
+            name='normalized_url',
+            field=models.CharField(editable=False, max_length=1000, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_normalized_urls, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0006_newsfeed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsarticle',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='near_duplicates', to='news.newsarticle'),
+        ),
+        migrations.AddField(
+            model_name='newsarticle',
+            name='minhash',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='NewsFingerprintBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('value', models.BigIntegerField()),
+                ('published_at', models.DateTimeField()),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprint_bands', to='news.newsarticle')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band', 'value', 'published_at'], name='news_fingerprint_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('article', 'band'), name='news_fingerprint_article_band_uniq')],
+            },
+        ),
+    ]
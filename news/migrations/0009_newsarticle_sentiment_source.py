@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0008_enrichmentrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsarticle',
+            name='sentiment_source',
+            field=models.CharField(blank=True, choices=[('', 'Editor'), ('llm', 'Enrichment pipeline'), ('classifier', 'Local classifier')], default='', max_length=20),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0009_newsarticle_sentiment_source'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Instrument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=16, unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('exchange', models.CharField(blank=True, max_length=20)),
+                ('aliases', models.JSONField(blank=True, default=list)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='newsarticle',
+            name='instruments_extracted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='ArticleInstrument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mentions', models.PositiveSmallIntegerField(default=1)),
+                ('published_at', models.DateTimeField()),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instrument_links', to='news.newsarticle')),
+                ('instrument', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='article_links', to='news.instrument')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['instrument', '-published_at', 'article'], name='news_instrument_published_idx')],
+                'constraints': [models.UniqueConstraint(fields=('article', 'instrument'), name='news_article_instrument_uniq')],
+            },
+        ),
+    ]
@@ -1,5 +1,10 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.db.models.functions import Upper
+
+from .managers import NewsArticleManager
+from .utils import normalize_url
 
 # Create your models here.
 class NewsArticle(models.Model):
@@ -12,6 +17,9 @@ class NewsArticle(models.Model):
     title = models.CharField(max_length=500)
     source = models.CharField(max_length=200)
     original_url = models.URLField(max_length=1000)
+    # Deduplication key for ingestion, derived from original_url on save.
+    # NULL on older duplicates that predate the key.
+    normalized_url = models.CharField(max_length=1000, unique=True, null=True, editable=False)
     published_at = models.DateTimeField()
     content = models.TextField()
     ai_summary = models.TextField(blank=True)
@@ -23,6 +31,165 @@ class NewsArticle(models.Model):
         blank=True
     )
     tags = models.JSONField(default=list)
+    # Where `sentiment` came from; blank for editors and API clients.
+    # The local classifier trains on everything but its own output.
+    SENTIMENT_SOURCE_CHOICES = [
+        ('', 'Editor'),
+        ('llm', 'Enrichment pipeline'),
+        ('classifier', 'Local classifier'),
+    ]
+    sentiment_source = models.CharField(
+        max_length=20, choices=SENTIMENT_SOURCE_CHOICES, blank=True, default='',
+    )
+    # When instruments were last extracted (extract_instruments)
+    instruments_extracted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # MinHash signature of title and content (news.fingerprints); NULL
+    # for texts too short to sign
+    minhash = models.BinaryField(null=True, blank=True, editable=False)
+    # The earliest article of this one's near-duplicate cluster
+    duplicate_of = models.ForeignKey(
+        'self', null=True, blank=True, editable=False,
+        on_delete=models.SET_NULL, related_name='near_duplicates',
+    )
+
+    objects = NewsArticleManager()
+
+    class Meta:
+        indexes = [
+            # Backs keyset pagination on (published_at, id)
+            models.Index(fields=['published_at', 'id'], name='news_published_id_idx'),
+            # Back `categories__contains=[...]` / `tags__contains=[...]` (jsonb @>)
+            GinIndex(
+                fields=['categories'],
+                opclasses=['jsonb_path_ops'],
+                name='news_categories_gin_idx',
+            ),
+            GinIndex(
+                fields=['tags'],
+                opclasses=['jsonb_path_ops'],
+                name='news_tags_gin_idx',
+            ),
+            # Sentiment filter / by-sentiment, newest first
+            models.Index(
+                fields=['sentiment', 'published_at', 'id'],
+                name='news_sentiment_published_idx',
+            ),
+            # NewsArticleFilter.source is case-insensitive (UPPER(source) = UPPER(%s))
+            models.Index(Upper('source'), name='news_source_upper_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Older duplicates keep no key rather than collide with the original
+        if self._state.adding or self.normalized_url is not None:
+            self.normalized_url = normalize_url(self.original_url)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'original_url' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_url'}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.title
+
+class NewsFingerprintBand(models.Model):
+    """
+    The key of one band of an article's MinHash signature, for finding
+    near-duplicate candidates by exact match. published_at is copied from
+    the article so lookups can be limited to recent articles from the
+    index alone.
+    """
+    article = models.ForeignKey(NewsArticle, on_delete=models.CASCADE, related_name='fingerprint_bands')
+    band = models.PositiveSmallIntegerField()
+    value = models.BigIntegerField()
+    published_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['article', 'band'], name='news_fingerprint_article_band_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['band', 'value', 'published_at'], name='news_fingerprint_lookup_idx'),
+        ]
+
+
+class Instrument(models.Model):
+    """
+    A tradable instrument articles can be linked to. Organization names
+    found in articles are matched against `name` and `aliases` (see
+    news.entities.normalize_org), ticker mentions against `symbol`.
+    """
+    symbol = models.CharField(max_length=16, unique=True)
+    name = models.CharField(max_length=200)
+    exchange = models.CharField(max_length=20, blank=True)
+    aliases = models.JSONField(default=list, blank=True)
+
+    def save(self, *args, **kwargs):
+        self.symbol = self.symbol.upper()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f'{self.symbol} ({self.name})'
+
+
+class ArticleInstrument(models.Model):
+    """
+    An instrument mentioned in an article. published_at is copied from
+    the article so "latest news about X" is answered from the index.
+    """
+    article = models.ForeignKey(NewsArticle, on_delete=models.CASCADE, related_name='instrument_links')
+    instrument = models.ForeignKey(Instrument, on_delete=models.CASCADE, related_name='article_links')
+    mentions = models.PositiveSmallIntegerField(default=1)
+    published_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['article', 'instrument'], name='news_article_instrument_uniq'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['instrument', '-published_at', 'article'], name='news_instrument_published_idx',
+            ),
+        ]
+
+
+class NewsFeed(models.Model):
+    """
+    An RSS/Atom feed polled by the ingest_feeds command. The validators
+    of the last response are kept for conditional requests.
+    """
+    url = models.URLField(max_length=1000, unique=True)
+    # Stored as NewsArticle.source; the feed's own title when blank
+    source = models.CharField(max_length=200, blank=True)
+    active = models.BooleanField(default=True)
+    etag = models.CharField(max_length=500, blank=True)
+    last_modified = models.CharField(max_length=100, blank=True)
+    last_fetched_at = models.DateTimeField(null=True, blank=True)
+    last_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return self.source or self.url
+
+
+class EnrichmentRun(models.Model):
+    """
+    One run of the enrichment pipeline (news.enrichment), with what it
+    did and what it cost.
+    """
+    client = models.CharField(max_length=100)
+    model = models.CharField(max_length=100, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    articles_selected = models.PositiveIntegerField(default=0)
+    articles_enriched = models.PositiveIntegerField(default=0)
+    articles_failed = models.PositiveIntegerField(default=0)
+    batches = models.PositiveIntegerField(default=0)
+    batches_failed = models.PositiveIntegerField(default=0)
+    retries = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.PositiveBigIntegerField(default=0)
+    completion_tokens = models.PositiveBigIntegerField(default=0)
+    # USD, from NEWS_ENRICHMENT_PRICES
+    cost = models.DecimalField(max_digits=12, decimal_places=6, default=0)
+    last_error = models.TextField(blank=True)
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f'{self.client} run at {self.started_at:%Y-%m-%d %H:%M}'
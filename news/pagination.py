@@ -1,7 +1,183 @@
 # apps/news/pagination.py
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 class NewsArticlePagination(PageNumberPagination):
     page_size = 20  # Default number of articles per page
     page_size_query_param = 'page_size'
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+
+
+class KeysetPagination(NewsArticlePagination):
+    """
+    Page-number pagination by default, keyset (cursor) pagination on
+    request.
+
+    Clients opt in with `?pagination=cursor` and then follow the `next`
+    and `previous` links, which carry an opaque `cursor` parameter. In
+    cursor mode the queryset is ordered by `ordering` (a timestamp field
+    and the primary key, both descending) and each page is a range read
+    starting right after the last row of the previous one, so there is
+    no COUNT(*) and no OFFSET: deep pages cost the same as the first.
+    """
+    ordering = ('-created_at', '-id')
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    invalid_cursor_message = 'Invalid cursor'
+    # Reads `paginate_source` makes to fill a page `fetch` came back short on
+    max_fetches = 4
+    # Where the next page starts when it isn't right after the last row
+    next_position = None
+
+    def use_cursor(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.use_cursor(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self.flip(field) for field in ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(position, ordering))
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = rows
+        return rows
+
+    def paginate_source(self, fetch, request):
+        """
+        Forward-only cursor pagination over rows produced by
+        `fetch(position, limit)` instead of a single queryset, such as a
+        merged timeline.
+
+        `fetch` reads up to `limit` entries of the source after
+        `position` and returns `(rows, next_position)`: the rows it kept,
+        in `ordering`, and the `(timestamp, id)` of the last entry it
+        read, or None once the source is exhausted. Entries it drops
+        (hidden, repeated) are made up with further reads; if the page is
+        still short after `max_fetches`, `next` continues from the last
+        entry read, so a short page never ends the walk early.
+        """
+        self.cursor_mode = True
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        position, _ = self.decode_cursor(request)
+
+        rows = []
+        for _ in range(self.max_fetches):
+            fetched, position = fetch(position, page_size + 1 - len(rows))
+            rows.extend(fetched)
+            if position is None or len(rows) > page_size:
+                break
+
+        self.has_previous = False
+        self.page = rows[:page_size]
+        if len(rows) > page_size:
+            self.has_next = True
+        else:
+            self.has_next = position is not None
+            if position is not None:
+                stamp, pk = position
+                self.next_position = [stamp.isoformat(), pk]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if self.has_next and self.next_position is not None:
+            return self.encode_cursor(self.next_position, reverse=False)
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(self.position_of(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not (self.has_previous and self.page):
+            return None
+        return self.encode_cursor(self.position_of(self.page[0]), reverse=True)
+
+    # Cursor helpers
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def position_of(self, obj):
+        """
+        Return the `(timestamp, id)` key of a row as cursor-safe values.
+        """
+        stamp_field, id_field = (field.lstrip('-') for field in self.ordering)
+        return [getattr(obj, stamp_field).isoformat(), getattr(obj, id_field)]
+
+    def after(self, position, ordering):
+        """
+        Rows strictly after `position` in `ordering`, written so the
+        timestamp bound starts an index range scan.
+        """
+        stamp, pk = position
+        (stamp_field, id_field) = (field.lstrip('-') for field in ordering)
+        op = 'lt' if ordering[0].startswith('-') else 'gt'
+        return Q(**{f'{stamp_field}__{op}e': stamp}) & (
+            Q(**{f'{stamp_field}__{op}': stamp}) | Q(**{f'{id_field}__{op}': pk})
+        )
+
+    def encode_cursor(self, position, reverse, url=None):
+        token = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(token.encode()).decode()
+        url = remove_query_param(url or self.base_url, 'page')
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            token = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            stamp, pk = token['p']
+            return (datetime.fromisoformat(stamp), int(pk)), bool(token['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class CreatedAtKeysetPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class PublishedAtKeysetPagination(KeysetPagination):
+    ordering = ('-published_at', '-id')
@@ -0,0 +1,123 @@
+# apps/news/sentiment.py
+"""
+Local sentiment classifier for news articles.
+
+A TF-IDF + logistic regression pipeline is trained on articles whose
+sentiment came from an editor or the enrichment pipeline, never on its
+own predictions, and saved with joblib to NEWS_SENTIMENT_MODEL_PATH.
+Scoring is one `predict` call over a whole batch of texts, so ingest and
+backfills classify thousands of articles per second without a network
+round trip.
+"""
+import os
+import threading
+
+import joblib
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .fingerprints import article_text
+
+CLASSIFIER_SOURCE = 'classifier'
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def get_model_path():
+    return getattr(settings, 'NEWS_SENTIMENT_MODEL_PATH', None)
+
+
+def build_pipeline():
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+
+    return make_pipeline(
+        TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, min_df=1, max_features=200_000),
+        LogisticRegression(max_iter=1000, class_weight='balanced'),
+    )
+
+
+def train(texts, labels, holdout=0.2, random_state=0):
+    """
+    Fit a pipeline on `texts`/`labels`. A stratified `holdout` share is
+    scored first to measure agreement with the labels, then the model is
+    refit on everything. Returns the saved bundle (see `save_model`).
+    """
+    from sklearn.model_selection import train_test_split
+
+    labels = np.asarray(labels)
+    classes, counts = np.unique(labels, return_counts=True)
+    if len(classes) < 2:
+        raise ValueError('Training needs articles of at least two sentiments.')
+
+    agreement = None
+    if holdout and counts.min() >= 2 and len(labels) * holdout >= len(classes):
+        train_texts, test_texts, train_labels, test_labels = train_test_split(
+            texts, labels, test_size=holdout, stratify=labels, random_state=random_state,
+        )
+        pipeline = build_pipeline().fit(train_texts, train_labels)
+        agreement = float(np.mean(pipeline.predict(test_texts) == test_labels))
+
+    pipeline = build_pipeline().fit(texts, labels)
+    return {
+        'pipeline': pipeline,
+        'classes': classes.tolist(),
+        'samples': len(labels),
+        'holdout_agreement': agreement,
+        'trained_at': timezone.now(),
+    }
+
+
+def save_model(bundle, path=None):
+    path = path or get_model_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written aside and renamed, so a scoring process never reads half a file
+    joblib.dump(bundle, f'{path}.tmp')
+    os.replace(f'{path}.tmp', path)
+
+
+def load_model(path=None):
+    """
+    Return the saved bundle, or None when no model has been trained. The
+    bundle is kept per process and reloaded when the file changes.
+    """
+    path = path or get_model_path()
+    if not path:
+        return None
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _lock:
+        cached = _loaded.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = _loaded[path] = (mtime, joblib.load(path))
+        return cached[1]
+
+
+def predict(bundle, texts):
+    if not texts:
+        return []
+    return bundle['pipeline'].predict(texts).tolist()
+
+
+def classify_missing(articles):
+    """
+    Set the sentiment of `articles` that have none from the saved model,
+    in one vectorized call. Returns how many were classified; 0 when
+    NEWS_SENTIMENT_ON_INGEST is off or there is no model.
+    """
+    if not getattr(settings, 'NEWS_SENTIMENT_ON_INGEST', True):
+        return 0
+    pending = [article for article in articles if article.sentiment is None]
+    bundle = load_model() if pending else None
+    if bundle is None:
+        return 0
+    labels = predict(bundle, [article_text(a.title, a.content) for a in pending])
+    for article, label in zip(pending, labels):
+        article.sentiment = label
+        article.sentiment_source = CLASSIFIER_SOURCE
+    return len(pending)
@@ -1,6 +1,7 @@
 # apps/news/serializers.py
 from rest_framework import serializers
 from .models import NewsArticle
+from .utils import normalize_url
 
 class NewsArticleSerializer(serializers.ModelSerializer):
     class Meta:
@@ -15,11 +16,60 @@ class NewsArticleSerializer(serializers.ModelSerializer):
             'ai_summary', 
             'categories', 
             'sentiment', 
-            'tags'
+            'tags',
+            'duplicate_of',
         ]
-        read_only_fields = ['id']
+        read_only_fields = ['id', 'duplicate_of']
+
+def validate_normalized_url(value):
+    """
+    Return the normalized form of `value`, which normalizing can make
+    longer (http becomes https) than the column holding it.
+    """
+    key = normalize_url(value)
+    max_length = NewsArticle._meta.get_field('normalized_url').max_length
+    if len(key) > max_length:
+        raise serializers.ValidationError(
+            f'Ensure this URL has no more than {max_length} characters once normalized.'
+        )
+    return key
+
+class UniqueURLMixin:
+    def validate_original_url(self, value):
+        duplicates = NewsArticle.objects.filter(normalized_url=validate_normalized_url(value))
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError('An article with this URL already exists.')
+        return value
+
+class FingerprintMixin:
+    # Keeps the near-duplicate index current for single writes
+    def create(self, validated_data):
+        article = super().create(validated_data)
+        NewsArticle.objects.fingerprint([article])
+        return article
+
+    def update(self, instance, validated_data):
+        article = super().update(instance, validated_data)
+        if {'title', 'content'} & validated_data.keys():
+            NewsArticle.objects.fingerprint([article])
+        return article
+
+class EditorSentimentMixin:
+    # A sentiment set through the API is an editor's, whatever set it
+    # before, so training keeps it and rescoring leaves it alone
+    def create(self, validated_data):
+        if 'sentiment' in validated_data:
+            validated_data['sentiment_source'] = ''
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        if 'sentiment' in validated_data:
+            validated_data['sentiment_source'] = ''
+        return super().update(instance, validated_data)
 
-class NewsArticleCreateSerializer(serializers.ModelSerializer):
+class NewsArticleCreateSerializer(EditorSentimentMixin, UniqueURLMixin, FingerprintMixin, serializers.ModelSerializer):
     class Meta:
         model = NewsArticle
         fields = [
@@ -34,7 +84,7 @@ class NewsArticleCreateSerializer(serializers.ModelSerializer):
             'tags'
         ]
 
-class NewsArticleUpdateSerializer(serializers.ModelSerializer):
+class NewsArticleUpdateSerializer(EditorSentimentMixin, UniqueURLMixin, FingerprintMixin, serializers.ModelSerializer):
     class Meta:
         model = NewsArticle
         fields = [
@@ -46,4 +96,51 @@ class NewsArticleUpdateSerializer(serializers.ModelSerializer):
             'categories', 
             'sentiment', 
             'tags'
-        ]
\ No newline at end of file
+        ]
+
+class NewsArticleIngestItemSerializer(NewsArticleCreateSerializer):
+    # On ingest a known URL updates the article instead of failing
+    def validate_original_url(self, value):
+        validate_normalized_url(value)
+        return value
+
+class NewsArticleIngestSerializer(serializers.Serializer):
+    """
+    A scraper batch. Each article is validated on its own, so invalid
+    entries are reported without rejecting the rest, and the valid ones
+    are written with `NewsArticle.objects.bulk_ingest`.
+    """
+    max_batch_size = 5000
+
+    articles = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_articles(self, articles):
+        if len(articles) > self.max_batch_size:
+            raise serializers.ValidationError(
+                f'At most {self.max_batch_size} articles per batch.'
+            )
+        return articles
+
+    def save(self):
+        """
+        Return one result per submitted article, in order: `{"index",
+        "status", "id", "duplicate_of"}` with status created, updated or
+        duplicate (of another entry with the same URL) and duplicate_of
+        the article this one is a near-duplicate of, or `{"index",
+        "status": "invalid", "errors"}`.
+        """
+        item_serializer = NewsArticleIngestItemSerializer()
+        valid, results = [], []
+        for index, item in enumerate(self.validated_data['articles']):
+            try:
+                valid.append((index, item_serializer.run_validation(item)))
+            except serializers.ValidationError as exc:
+                results.append({'index': index, 'status': 'invalid', 'errors': exc.detail})
+
+        written = NewsArticle.objects.bulk_ingest([fields for _, fields in valid])
+        results.extend(
+            {'index': index, 'status': status, 'id': article.pk, 'duplicate_of': article.duplicate_of_id}
+            for (index, _), (article, status) in zip(valid, written)
+        )
+        results.sort(key=lambda result: result['index'])
+        return results
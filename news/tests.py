@@ -1,3 +1,810 @@
-from django.test import TestCase
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import spacy
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from posts.tests import IndexPlanMixin
+
+from .enrichment import StubEnrichmentClient, TransientEnrichmentError, enrich_articles
+from .entities import find_tickers, normalize_org
+from .feed_parsing import parse_feed
+from .feeds import get_field_limits
+from .fingerprints import BANDS
+from .models import ArticleInstrument, EnrichmentRun, Instrument, NewsArticle, NewsFeed
+from .sentiment import predict
+from .utils import normalize_url
+
+
+def make_article(n, **fields):
+    defaults = {
+        'title': f'Headline {n}',
+        'source': 'Wire',
+        'original_url': f'https://example.com/articles/{n}',
+        'published_at': timezone.now() - timedelta(minutes=n),
+        'content': f'Body of article {n}',
+    }
+    defaults.update(fields)
+    return NewsArticle.objects.create(**defaults)
+
+
+class NewsConditionalGetTests(APITestCase):
+    def test_detail_is_revalidated_after_an_update(self):
+        cache.clear()
+        article = make_article(1)
+        url = f'/api/news/{article.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        article.title = 'Corrected headline'
+        article.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], 'Corrected headline')
+
+
+class NewsResultCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_list_is_served_from_the_cache_until_a_write(self):
+        make_article(1)
+        first = self.client.get('/api/news/', {'page_size': 10})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/news/', {'page_size': 10})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+
+        make_article(2)
+        third = self.client.get('/api/news/', {'page_size': 10})
+        self.assertEqual(third['X-Cache'], 'MISS')
+        self.assertEqual(len(third.data['results']), 2)
+
+    def test_stats_are_reported_to_staff(self):
+        self.client.get('/api/news/')
+        self.client.get('/api/news/')
+        self.assertEqual(self.client.get('/api/cache-stats/').status_code, 401)
+
+        User = get_user_model()
+        User.objects.create_user(email='ops@example.com', username='ops', id='1', is_staff=True)
+        self.client.force_authenticate(User.objects.get(email='ops@example.com'))
+        stats = self.client.get('/api/cache-stats/').data
+        self.assertEqual(
+            stats['NewsArticleViewSet'],
+            {'hits': 1, 'misses': 1, 'stale': 0, 'coalesced': 0, 'hit_rate': 0.5},
+        )
+
+
+def result_keys(response):
+    """
+    The fresh, stale and lock keys of the request that got `response`.
+    """
+    view = response.renderer_context['view']
+    token, _ = view.get_version_token(view.request)
+    return view.get_result_keys(view.request, token)
+
+
+@override_settings(RESULT_CACHE_WAIT=0.3)
+class NewsSingleFlightTests(APITestCase):
+    url = '/api/news/by-sentiment/'
+    params = {'sentiment': 'positive'}
+
+    def setUp(self):
+        cache.clear()
+        make_article(1, sentiment='positive')
+
+    def test_followers_get_the_stale_result_while_one_worker_recomputes(self):
+        _, _, lock = result_keys(self.client.get(self.url, self.params))
+        make_article(2, sentiment='positive')
+        cache.add(lock, 'other-worker', 10)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, self.params)
+        self.assertEqual(response['X-Cache'], 'STALE')
+        self.assertEqual(len(response.data), 1)
+        self.assertNotIn('ETag', response)
+
+        cache.delete(lock)
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data), 2)
+
+    def test_followers_wait_for_the_recomputed_result(self):
+        fresh, stale, lock = result_keys(self.client.get(self.url, self.params))
+        # Expired, nothing stale to serve, another worker recomputing
+        cache.delete_many([fresh, stale])
+        cache.add(lock, 'other-worker', 10)
+        leader = threading.Timer(0.1, cache.set, args=(fresh, [{'title': 'From the leader'}]))
+        leader.start()
+        self.addCleanup(leader.cancel)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, self.params)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data, [{'title': 'From the leader'}])
+
+    def test_followers_compute_when_the_wait_runs_out(self):
+        fresh, stale, lock = result_keys(self.client.get(self.url, self.params))
+        cache.delete_many([fresh, stale])
+        cache.add(lock, 'stuck-worker', 10)
+
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data), 1)
+
+
+class NewsBackgroundRefreshTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_stale_result_is_served_while_refreshing_in_the_background(self):
+        make_article(1, categories=['markets'])
+        url, params = '/api/news/by-category/', {'category': 'markets'}
+        self.assertEqual(self.client.get(url, params)['X-Cache'], 'MISS')
+        make_article(2, categories=['markets'])
+
+        response = self.client.get(url, params)
+        self.assertEqual(response['X-Cache'], 'STALE')
+        self.assertEqual(len(response.data), 1)
+
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            response = self.client.get(url, params)
+            if response['X-Cache'] == 'HIT':
+                break
+            time.sleep(0.05)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(response.data), 2)
+
+
+class NewsIngestTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create_user(email='scraper@example.com', username='scraper', id='1')
+        self.client.force_authenticate(User.objects.get(email='scraper@example.com'))
+
+    def article(self, n, url=None, **fields):
+        return {
+            'title': f'Headline {n}',
+            'source': 'Wire',
+            'original_url': url or f'https://example.com/articles/{n}',
+            'published_at': (timezone.now() - timedelta(minutes=n)).isoformat(),
+            'content': f'Body of article {n}',
+            **fields,
+        }
+
+    def test_urls_are_normalized(self):
+        self.assertEqual(
+            normalize_url('HTTP://www.Example.com:80/a/b/?utm_source=x&b=2&a=1#top'),
+            'https://example.com/a/b?a=1&b=2',
+        )
+
+    def test_batch_reports_each_article(self):
+        existing = make_article(1, sentiment='positive')
+        response = self.client.post('/api/news/ingest/', {'articles': [
+            self.article(1, title='Updated headline'),
+            self.article(2),
+            self.article(3, url='https://example.com/articles/3/'),
+            self.article(4, url='not a url'),
+            # Same article as the third, tracking parameter and all
+            self.article(3, url='http://www.example.com/articles/3?utm_medium=rss', title='Last wins'),
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        results = response.data['results']
+        self.assertEqual(
+            [result['status'] for result in results],
+            ['updated', 'created', 'duplicate', 'invalid', 'created'],
+        )
+        self.assertEqual(results[0]['id'], existing.pk)
+        self.assertEqual(results[2]['id'], results[4]['id'])
+        self.assertIn('original_url', results[3]['errors'])
+
+        self.assertEqual(NewsArticle.objects.count(), 3)
+        existing.refresh_from_db()
+        # Scraped fields are overwritten, enrichment is kept
+        self.assertEqual((existing.title, existing.sentiment), ('Updated headline', 'positive'))
+        self.assertEqual(NewsArticle.objects.get(pk=results[4]['id']).title, 'Last wins')
+
+    def test_reingest_keeps_fields_it_does_not_send(self):
+        existing = make_article(1, categories=['earnings'], tags=['q3'])
+        self.client.post('/api/news/ingest/', {'articles': [
+            self.article(1, title='Updated headline'),
+        ]}, format='json')
+        existing.refresh_from_db()
+        self.assertEqual((existing.title, existing.categories, existing.tags), ('Updated headline', ['earnings'], ['q3']))
+
+        self.client.post('/api/news/ingest/', {'articles': [
+            self.article(1, categories=['macro']),
+        ]}, format='json')
+        existing.refresh_from_db()
+        self.assertEqual((existing.categories, existing.tags), (['macro'], ['q3']))
+
+    def test_large_batches_take_a_statement_per_thousand_rows(self):
+        articles = [self.article(n) for n in range(2500)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/news/ingest/', {'articles': articles}, format='json')
+        self.assertEqual(response.status_code, 200)
+        statements = [q['sql'] for q in queries if 'SAVEPOINT' not in q['sql']]
+        # Three lookups of known URLs and three inserts, then fingerprinting:
+        # old band rows deleted, candidates looked up, signatures saved
+        self.assertEqual(len(statements), 9)
+        self.assertEqual(NewsArticle.objects.count(), 2500)
+
+    def test_urls_too_long_once_normalized_are_invalid(self):
+        # 1000 characters, 1001 once http becomes https
+        url = 'http://example.com/' + 'a' * (1000 - len('http://example.com/'))
+        response = self.client.post('/api/news/ingest/', {'articles': [
+            self.article(1, url=url), self.article(2),
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['invalid', 'created'])
+        self.assertIn('original_url', results[0]['errors'])
+
+    def test_single_create_rejects_a_known_url(self):
+        make_article(1)
+        response = self.client.post(
+            '/api/news/', self.article(1, url='https://www.example.com/articles/1/'), format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('original_url', response.data)
+
+
+FED_STORY = (
+    'The Federal Reserve held interest rates steady on Wednesday, signalling that policymakers '
+    'want more evidence that inflation is cooling before they begin cutting borrowing costs. '
+    'Chair Jerome Powell told reporters the committee remains attentive to risks on both sides '
+    'of its mandate, and that the labour market has come into better balance over the past '
+    'year while price pressures eased.'
+)
+# The same wire story as rewritten by another outlet
+FED_STORY_EDITED = FED_STORY.replace('on Wednesday', 'on Wednesday afternoon').replace('told reporters', 'said')
+OIL_STORY = (
+    'Oil prices slid for a third session as traders weighed rising inventories in the United '
+    'States against supply cuts by major producers, with Brent crude settling near its lowest '
+    'level since June and analysts warning that demand in China remains fragile heading into '
+    'the winter months ahead.'
+)
+
+
+class NearDuplicateTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_ingest_clusters_near_duplicates(self):
+        User = get_user_model()
+        User.objects.create_user(email='scraper@example.com', username='scraper', id='1')
+        self.client.force_authenticate(User.objects.get(email='scraper@example.com'))
+        now = timezone.now()
+        articles = [
+            {'title': 'Fed holds rates steady', 'source': 'Wire', 'content': FED_STORY,
+             'original_url': 'https://wire.example.com/fed', 'published_at': now.isoformat()},
+            {'title': 'Oil slides', 'source': 'Wire', 'content': OIL_STORY,
+             'original_url': 'https://wire.example.com/oil', 'published_at': now.isoformat()},
+            {'title': 'Fed holds rates steady as expected', 'source': 'Daily', 'content': FED_STORY_EDITED,
+             'original_url': 'https://daily.example.com/fed-holds', 'published_at': now.isoformat()},
+        ]
+        results = self.client.post('/api/news/ingest/', {'articles': articles}, format='json').data['results']
+        self.assertEqual(
+            [result['duplicate_of'] for result in results], [None, None, results[0]['id']],
+        )
+
+        # A later copy joins the cluster of the first article
+        repost = {**articles[2], 'source': 'Repost', 'original_url': 'https://repost.example.com/fed'}
+        result = self.client.post('/api/news/ingest/', {'articles': [repost]}, format='json').data['results'][0]
+        self.assertEqual(result['duplicate_of'], results[0]['id'])
+
+        response = self.client.get('/api/news/', {'duplicates': 'false', 'page_size': 10})
+        self.assertEqual(
+            sorted(item['id'] for item in response.data['results']),
+            [results[0]['id'], results[1]['id']],
+        )
+
+    def test_backfill_command(self):
+        first = make_article(1, title='Fed holds rates steady', content=FED_STORY)
+        copy = make_article(2, title='Fed holds rates steady as expected', content=FED_STORY_EDITED)
+        other = make_article(3, title='Oil slides', content=OIL_STORY)
+        # Outside the duplicate window of the first
+        old_copy = make_article(
+            4, title='Fed holds rates steady', content=FED_STORY,
+            published_at=timezone.now() - timedelta(days=30),
+        )
+        short = make_article(5)
+
+        out = StringIO()
+        call_command('fingerprint_news', batch_size=2, stdout=out)
+        self.assertIn('Fingerprinted 5 articles, 1 near-duplicates', out.getvalue())
+        duplicate_of = dict(NewsArticle.objects.values_list('id', 'duplicate_of'))
+        self.assertEqual(
+            [duplicate_of[a.pk] for a in (first, copy, other, old_copy, short)],
+            [None, first.pk, None, None, None],
+        )
+        self.assertEqual(first.fingerprint_bands.count(), BANDS)
+        self.assertFalse(short.fingerprint_bands.exists())
+
+
+class FlakyEnrichmentClient(StubEnrichmentClient):
+    """
+    Fails the first call of every batch with a transient error, and every
+    call for batches containing `poisoned`.
+    """
+    def __init__(self, poisoned=()):
+        super().__init__()
+        self.poisoned = set(poisoned)
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def enrich(self, articles):
+        ids = frozenset(article.pk for article in articles)
+        if ids & self.poisoned:
+            raise ValueError('Malformed response')
+        with self.lock:
+            first_call = ids not in self.seen
+            self.seen.add(ids)
+        if first_call:
+            raise TransientEnrichmentError('Rate limited')
+        return super().enrich(articles)
+
+
+class EnrichmentPipelineTests(APITestCase):
+    def setUp(self):
+        self.rally = make_article(1, content='Stocks rose to a record as the tech rally gained pace')
+        self.slump = make_article(2, content='Shares fell after the bank posted a surprise loss')
+        self.edited = make_article(3, content='Oil was flat', ai_summary='Written by an editor')
+        self.done = make_article(4, ai_summary='Done', sentiment='neutral')
+
+    def test_stub_run_fills_missing_fields(self):
+        out = StringIO()
+        call_command(
+            'enrich_news', client='news.enrichment.StubEnrichmentClient', batch_size=2, stdout=out,
+        )
+        self.assertIn('Enriched 3 of 3 articles', out.getvalue())
+
+        values = dict(
+            (pk, (summary, sentiment))
+            for pk, summary, sentiment in NewsArticle.objects.values_list('id', 'ai_summary', 'sentiment')
+        )
+        self.assertEqual(values[self.rally.pk][1], 'positive')
+        self.assertEqual(values[self.slump.pk], (self.slump.content, 'negative'))
+        # Only what was missing is filled in
+        self.assertEqual(values[self.edited.pk], ('Written by an editor', 'neutral'))
+        self.assertEqual(values[self.done.pk], ('Done', 'neutral'))
+
+        run = EnrichmentRun.objects.get()
+        self.assertEqual((run.client, run.batches, run.articles_failed), ('StubEnrichmentClient', 2, 0))
+        self.assertGreater(run.prompt_tokens, 0)
+        self.assertIsNotNone(run.finished_at)
+
+    @override_settings(NEWS_ENRICHMENT_PRICES={'stub': ('1000000', '2000000')})
+    def test_transient_errors_are_retried_and_failures_recorded(self):
+        client = FlakyEnrichmentClient(poisoned={self.slump.pk})
+        run = enrich_articles(client, batch_size=1, concurrency=2, backoff=0)
+        self.assertEqual(
+            (run.articles_selected, run.articles_enriched, run.articles_failed), (3, 2, 1),
+        )
+        self.assertEqual((run.batches, run.batches_failed, run.retries), (3, 1, 2))
+        self.assertEqual(run.last_error, 'ValueError: Malformed response')
+        self.assertEqual(run.cost, run.prompt_tokens + 2 * run.completion_tokens)
+        self.assertIsNone(NewsArticle.objects.get(pk=self.slump.pk).sentiment)
+
+    def test_tokens_of_failed_attempts_are_counted(self):
+        class BilledFailureClient(StubEnrichmentClient):
+            def enrich(self, articles):
+                raise TransientEnrichmentError('Timed out', prompt_tokens=10, completion_tokens=1)
+
+        run = enrich_articles(BilledFailureClient(), batch_size=3, max_retries=2, backoff=0)
+        self.assertEqual((run.batches_failed, run.retries), (1, 2))
+        self.assertEqual((run.prompt_tokens, run.completion_tokens), (30, 3))
+
+    def test_limit_takes_newest_first(self):
+        run = enrich_articles(StubEnrichmentClient(), limit=1)
+        self.assertEqual(run.articles_enriched, 1)
+        self.assertEqual(
+            list(NewsArticle.objects.filter(sentiment__isnull=True).order_by('id').values_list('id', flat=True)),
+            [self.rally.pk, self.slump.pk],
+        )
+
+
+class EditedMeanwhileClient(StubEnrichmentClient):
+    """
+    An editor fills in `edited` while the batch is being enriched.
+    """
+    def __init__(self, edited):
+        super().__init__()
+        self.edited = edited
+
+    def enrich(self, articles):
+        try:
+            NewsArticle.objects.filter(pk=self.edited).update(ai_summary='Editor', sentiment='neutral')
+        finally:
+            connection.close()
+        return super().enrich(articles)
+
+
+class EnrichmentConcurrencyTests(TransactionTestCase):
+    def test_edits_made_during_the_call_are_kept(self):
+        edited = make_article(1, content='Stocks rose to a record as the tech rally gained pace')
+        other = make_article(2, content='Shares fell after the bank posted a surprise loss')
+
+        run = enrich_articles(EditedMeanwhileClient(edited.pk))
+        self.assertEqual(run.articles_enriched, 2)
+        edited.refresh_from_db()
+        self.assertEqual((edited.ai_summary, edited.sentiment, edited.sentiment_source), ('Editor', 'neutral', ''))
+        other.refresh_from_db()
+        self.assertEqual((other.sentiment, other.sentiment_source), ('negative', 'llm'))
+
+
+COMPANIES = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark', 'Wayne', 'Cyberdyne']
+HEADLINES = {
+    'positive': '{} shares surge to a record high as profit beats forecasts and growth accelerates',
+    'negative': '{} shares plunge after a surprise loss, weak guidance and mounting layoffs',
+    'neutral': '{} will hold its annual shareholder meeting on the scheduled date next month',
+}
+
+
+class SentimentClassifierTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            NEWS_SENTIMENT_MODEL_PATH=os.path.join(directory.name, 'sentiment.joblib'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        n = 0
+        for sentiment, headline in HEADLINES.items():
+            for company in COMPANIES:
+                n += 1
+                make_article(n, title=headline.format(company), content='', sentiment=sentiment)
+
+    def test_train_then_classify_on_ingest_and_backfill(self):
+        out = StringIO()
+        call_command('train_news_sentiment', stdout=out)
+        self.assertIn('Trained on 24 articles', out.getvalue())
+        self.assertIn('holdout agreement 100.0%', out.getvalue())
+
+        [(article, _)] = NewsArticle.objects.bulk_ingest([{
+            'title': 'Contoso shares surge to a record high', 'source': 'Wire', 'content': '',
+            'original_url': 'https://example.com/contoso', 'published_at': timezone.now(),
+        }])
+        article.refresh_from_db()
+        self.assertEqual((article.sentiment, article.sentiment_source), ('positive', 'classifier'))
+
+        unlabelled = make_article(100, title='Vandelay shares plunge after a surprise loss', content='')
+        out = StringIO()
+        call_command('score_news_sentiment', batch_size=10, stdout=out)
+        self.assertIn('Scored 26 articles', out.getvalue())
+        self.assertIn('wrote 1, agreement 100.0% of 24 labelled', out.getvalue())
+        unlabelled.refresh_from_db()
+        self.assertEqual(unlabelled.sentiment, 'negative')
+
+    def test_scoring_needs_a_model(self):
+        with self.assertRaises(CommandError):
+            call_command('score_news_sentiment', stdout=StringIO())
+
+    def test_scoring_keeps_labels_saved_while_predicting(self):
+        call_command('train_news_sentiment', stdout=StringIO())
+        unlabelled = make_article(100, title='Vandelay shares plunge after a surprise loss', content='')
+
+        def editor_labels_first(bundle, texts):
+            NewsArticle.objects.filter(pk=unlabelled.pk).update(sentiment='neutral')
+            return predict(bundle, texts)
+
+        with mock.patch('news.management.commands.score_news_sentiment.predict', editor_labels_first):
+            out = StringIO()
+            call_command('score_news_sentiment', stdout=out)
+        self.assertIn('wrote 0', out.getvalue())
+        unlabelled.refresh_from_db()
+        self.assertEqual((unlabelled.sentiment, unlabelled.sentiment_source), ('neutral', ''))
+
+    def test_editor_correction_is_no_longer_a_prediction(self):
+        User = get_user_model()
+        editor = User.objects.create_user(email='editor@example.com', username='editor', id='1')
+        self.client.force_authenticate(User.objects.get(pk=editor.pk))
+        article = make_article(100, sentiment='positive', sentiment_source='classifier')
+
+        response = self.client.patch(f'/api/news/{article.pk}/', {'sentiment': 'negative'})
+        self.assertEqual(response.status_code, 200)
+        article.refresh_from_db()
+        self.assertEqual((article.sentiment, article.sentiment_source), ('negative', ''))
+
+        # Kept by a rescore and counted as a label for training
+        call_command('train_news_sentiment', stdout=StringIO())
+        out = StringIO()
+        call_command('score_news_sentiment', rescore=True, stdout=out)
+        self.assertIn('of 25 labelled', out.getvalue())
+        article.refresh_from_db()
+        self.assertEqual(article.sentiment, 'negative')
+
+
+class InstrumentExtractionTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # A stand-in for a trained pipeline: a rule-based ORG recognizer
+        cls.model_dir = tempfile.TemporaryDirectory()
+        nlp = spacy.blank('en')
+        nlp.add_pipe('entity_ruler').add_patterns([
+            {'label': 'ORG', 'pattern': name} for name in ('Tesla Inc', 'Apple', 'Acme Corp')
+        ])
+        nlp.to_disk(cls.model_dir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.model_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.tesla = Instrument.objects.create(symbol='tsla', name='Tesla, Inc.', exchange='NASDAQ')
+        self.apple = Instrument.objects.create(symbol='AAPL', name='Apple Inc.', exchange='NASDAQ')
+        self.msft = Instrument.objects.create(symbol='MSFT', name='Microsoft Corporation')
+        self.recall = make_article(1, title='Tesla Inc recalls vehicles', content='Shares of $TSLA fell. Tesla Inc said...')
+        self.suppliers = make_article(2, title='Apple suppliers rally', content='Microsoft (NASDAQ: MSFT) also rose.')
+        # Not a listed instrument
+        self.private = make_article(3, title='Acme Corp raises funding', content='A private round.')
+
+    def test_links_and_instrument_filter(self):
+        out = StringIO()
+        with override_settings(NEWS_SPACY_MODEL=self.model_dir.name):
+            call_command('extract_instruments', processes=2, batch_size=2, stdout=out)
+        self.assertIn('Processed 3 articles', out.getvalue())
+
+        links = set(ArticleInstrument.objects.values_list('article_id', 'instrument__symbol', 'mentions'))
+        self.assertEqual(links, {
+            (self.recall.pk, 'TSLA', 3),
+            (self.suppliers.pk, 'AAPL', 1),
+            (self.suppliers.pk, 'MSFT', 1),
+        })
+        self.assertEqual(NewsArticle.objects.filter(instruments_extracted_at__isnull=True).count(), 0)
+
+        response = self.client.get('/api/news/', {'instrument': '$tsla', 'page_size': 10})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.recall.pk])
+
+    def test_org_names_are_normalized(self):
+        self.assertEqual(normalize_org('The Tesla, Inc.'), 'tesla')
+        self.assertEqual(normalize_org("Apple Inc.'s"), 'apple')
+        self.assertEqual(find_tickers('Buy $brk.b, not $5; NYSE: F'), ['BRK.B', 'F'])
+
+
+MARKETS_RSS = """<?xml version="1.0"?>
+<rss version="2.0"><channel><title>Markets Wire</title>
+<item>
+  <title>Rates &amp; bonds</title>
+  <link>https://example.com/rates?utm_source=rss</link>
+  <pubDate>Mon, 06 Jan 2025 09:30:00 GMT</pubDate>
+  <category>rates</category>
+  <description><![CDATA[<p>Yields <b>rose</b>.</p><script>track()</script>]]></description>
+</item>
+<item>
+  <title>Oil slips</title>
+  <link>https://example.com/oil</link>
+  <description>Crude fell.</description>
+</item>
+</channel></rss>"""
+
+EQUITIES_ATOM = """<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom"><title>Equities</title>
+<entry>
+  <title>Rates and bonds</title>
+  <link href="https://www.example.com/rates/"/>
+  <updated>2025-01-06T10:00:00Z</updated>
+  <content type="html">&lt;p&gt;Yields rose again.&lt;/p&gt;</content>
+</entry>
+</feed>"""
+
+
+class FixtureFeedHandler(BaseHTTPRequestHandler):
+    # path: (body, etag)
+    feeds = {
+        '/markets.xml': (MARKETS_RSS, '"markets-1"'),
+        '/equities.xml': (EQUITIES_ATOM, '"equities-1"'),
+    }
+    requests = []
+
+    def do_GET(self):
+        type(self).requests.append((self.path, self.headers.get('If-None-Match')))
+        if self.path not in self.feeds:
+            self.send_response(404)
+            self.end_headers()
+            return
+        body, etag = self.feeds[self.path]
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class FeedIngestTests(APITestCase):
+    """
+    The ingest_feeds command against a local server serving fixture feeds.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureFeedHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        FixtureFeedHandler.requests = []
+        self.markets = NewsFeed.objects.create(url=f'{self.base_url}/markets.xml')
+        self.equities = NewsFeed.objects.create(url=f'{self.base_url}/equities.xml', source='Equities Desk')
+
+    def ingest(self):
+        out = StringIO()
+        call_command('ingest_feeds', workers=1, stdout=out, stderr=out)
+        return out.getvalue()
+
+    def test_feeds_are_parsed_cleaned_and_deduplicated(self):
+        output = self.ingest()
+        self.assertIn('2 feeds: 2 articles created, 0 updated, 1 duplicates', output)
+
+        # The same story in both feeds is stored once, the later feed winning
+        rates = NewsArticle.objects.get(normalized_url='https://example.com/rates')
+        self.assertEqual((rates.title, rates.source), ('Rates and bonds', 'Equities Desk'))
+        self.assertEqual(rates.content, 'Yields rose again.')
+        oil = NewsArticle.objects.get(title='Oil slips')
+        self.assertEqual((oil.source, oil.content), ('Markets Wire', 'Crude fell.'))
+
+        self.markets.refresh_from_db()
+        self.assertEqual((self.markets.etag, self.markets.last_status), ('"markets-1"', 200))
+
+    def test_unchanged_feeds_are_skipped(self):
+        self.ingest()
+        output = self.ingest()
+        self.assertIn('markets.xml: not modified', output)
+        self.assertIn('2 feeds: 0 articles created', output)
+        self.assertEqual(
+            sorted(FixtureFeedHandler.requests[-2:]),
+            [('/equities.xml', '"equities-1"'), ('/markets.xml', '"markets-1"')],
+        )
+
+    def test_undated_entries_keep_their_first_date(self):
+        self.ingest()
+        oil = NewsArticle.objects.get(title='Oil slips')
+        # Polled again in full, as if the feed had changed
+        NewsFeed.objects.update(etag='')
+        output = self.ingest()
+        self.assertIn('2 feeds: 0 articles created, 2 updated', output)
+        self.assertEqual(NewsArticle.objects.get(pk=oil.pk).published_at, oil.published_at)
+
+    def test_parsing_needs_no_django_setup_in_the_workers(self):
+        # Spawned workers start from a fresh interpreter
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            articles = pool.submit(parse_feed, MARKETS_RSS, '', get_field_limits()).result()
+        self.assertEqual([article['title'] for article in articles], ['Rates & bonds', 'Oil slips'])
+        self.assertNotIn('track', articles[0]['content'])
+
+    def test_failing_feed_does_not_stop_the_others(self):
+        missing = NewsFeed.objects.create(url=f'{self.base_url}/missing.xml')
+        output = self.ingest()
+        self.assertIn('missing.xml: HTTP 404', output)
+        missing.refresh_from_db()
+        self.assertEqual((missing.last_status, missing.last_error), (404, 'HTTP 404'))
+        self.assertEqual(NewsArticle.objects.count(), 2)
+
+
+class NewsCursorPaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Two articles share a timestamp so the id tie-breaker matters
+        cls.articles = [make_article(n) for n in range(5)]
+        cls.articles.append(make_article(5, published_at=cls.articles[2].published_at))
+
+    def test_cursor_pages_follow_published_at_then_id(self):
+        ids = []
+        response = self.client.get('/api/news/', {'pagination': 'cursor', 'page_size': 2})
+        while True:
+            ids.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        expected = [article.id for article in sorted(
+            self.articles, key=lambda a: (a.published_at, a.id), reverse=True
+        )]
+        self.assertEqual(ids, expected)
+
+    def test_page_numbers_remain_the_default(self):
+        response = self.client.get('/api/news/')
+        self.assertEqual(response.data['count'], 6)
+
+
+class NewsTagCategoryFilterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fed = make_article(1, categories=['macro', 'rates'], tags=['FOMC', 'USD'])
+        cls.tech = make_article(2, categories=['equities'], tags=['AAPL'], title='USD strength hits Apple')
+        make_article(3, categories=['macro'], tags=['ECB'])
+
+    def ids(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        data = response.data['results'] if isinstance(response.data, dict) else response.data
+        return sorted(item['id'] for item in data)
+
+    def test_category_and_tag_filters(self):
+        self.assertEqual(self.ids('/api/news/', category='rates'), [self.fed.id])
+        self.assertEqual(self.ids('/api/news/', tags='AAPL'), [self.tech.id])
+        self.assertEqual(len(self.ids('/api/news/by-category/', category='macro')), 2)
+
+    def test_search_matches_whole_tags_or_text(self):
+        # 'USD' is a tag on one article and in the title of another
+        self.assertEqual(self.ids('/api/news/', search='USD'), [self.fed.id, self.tech.id])
+        # A tag fragment no longer matches the serialized JSON
+        self.assertEqual(self.ids('/api/news/', search='FOM'), [])
+
+    def test_containment_uses_gin_index(self):
+        queryset = NewsArticle.objects.filter(tags__contains=['USD'])
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+        self.assertIn('news_tags_gin_idx', plan)
+
+
+class NewsIndexPlanTests(IndexPlanMixin, APITestCase):
+    """
+    The news endpoints' SELECTs must not need a sequential scan; see
+    posts.tests.IndexPlanMixin.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        for n in range(40):
+            make_article(
+                n,
+                source=('Reuters', 'Bloomberg', 'AP')[n % 3],
+                sentiment=('positive', 'negative', 'neutral')[n % 3],
+                categories=[('macro', 'equities')[n % 2]],
+                tags=[f'T{n % 7}'],
+            )
+
+    def test_news_endpoints(self):
+        cursor = {'pagination': 'cursor'}
+        self.assertIndexed('/api/news/', cursor, uses='news_published_id_idx')
+        self.assertIndexed(
+            '/api/news/', {'sentiment': 'negative', **cursor},
+            uses='news_sentiment_published_idx',
+        )
+        self.assertIndexed('/api/news/', {'source': 'reuters', **cursor}, uses='news_source_upper_idx')
+        self.assertIndexed('/api/news/', {'category': 'macro', **cursor}, uses='news_categories_gin_idx')
+        self.assertIndexed('/api/news/', {'tags': 'T3', **cursor}, uses='news_tags_gin_idx')
+        self.assertIndexed(
+            '/api/news/by-sentiment/', {'sentiment': 'positive'},
+            uses='news_sentiment_published_idx',
+        )
+        self.assertIndexed(
+            '/api/news/by-category/', {'category': 'equities'},
+            uses='news_categories_gin_idx',
+        )
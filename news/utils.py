@@ -0,0 +1,34 @@
+# apps/news/utils.py
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'mc_cid', 'mc_eid', 'ref', 'cmpid'}
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """
+    Reduce an article URL to the form used to detect duplicates.
+
+    Scrapers report the same article with different schemes, hosts in
+    mixed case, a `www.` prefix, tracking parameters, fragments and
+    trailing slashes; all of those map to the same key.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{parts.port}'
+
+    path = parts.path.rstrip('/') or '/'
+    query = urlencode(sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith('utm_')
+    ))
+    # http and https copies of an article are the same article
+    if scheme == 'http':
+        scheme = 'https'
+    return urlunsplit((scheme, host, path, query, ''))
@@ -3,25 +3,30 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 
 from .models import NewsArticle
 from .serializers import (
     NewsArticleSerializer, 
     NewsArticleCreateSerializer, 
-    NewsArticleUpdateSerializer
+    NewsArticleUpdateSerializer,
+    NewsArticleIngestSerializer,
 )
-from .filters import NewsArticleFilter
+from .filters import NewsArticleFilter, NewsArticleSearchFilter
+from .pagination import PublishedAtKeysetPagination
 
 
 from drf_spectacular.utils import extend_schema
+from financial_social_media.caching import CachedResultMixin, versioned_read
 
 @extend_schema(tags=['News'])
-class NewsArticleViewSet(viewsets.ModelViewSet):
+class NewsArticleViewSet(CachedResultMixin, viewsets.ModelViewSet):
     queryset = NewsArticle.objects.all().order_by('-published_at')
     serializer_class = NewsArticleSerializer
+    version_models = ('news.NewsArticle', 'news.ArticleInstrument')
+    pagination_class = PublishedAtKeysetPagination
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, NewsArticleSearchFilter, OrderingFilter]
     filterset_class = NewsArticleFilter
     search_fields = ['title', 'content', 'source', 'tags']
     ordering_fields = ['published_at', 'title', 'source']
@@ -29,11 +34,14 @@ class NewsArticleViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action == 'create':
             return NewsArticleCreateSerializer
+        elif self.action == 'ingest':
+            return NewsArticleIngestSerializer
         elif self.action in ['update', 'partial_update']:
             return NewsArticleUpdateSerializer
         return NewsArticleSerializer
 
     @action(detail=False, methods=['GET'], url_path='by-sentiment')
+    @versioned_read
     def articles_by_sentiment(self, request):
         sentiment = request.query_params.get('sentiment', None)
         if sentiment:
@@ -46,6 +54,7 @@ class NewsArticleViewSet(viewsets.ModelViewSet):
         )
 
     @action(detail=False, methods=['GET'], url_path='by-category')
+    @versioned_read
     def articles_by_category(self, request):
         category = request.query_params.get('category', None)
         if category:
@@ -57,6 +66,18 @@ class NewsArticleViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @action(detail=False, methods=['POST'], permission_classes=[permissions.IsAuthenticated])
+    def ingest(self, request):
+        """
+        Insert or update a batch of scraped articles:
+        `{"articles": [{...}, ...]}` with the fields of a create. Articles
+        are matched on their normalized URL, so a repeated URL updates the
+        stored article. Returns one result per article, in order.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': serializer.save()})
+
     @action(detail=True, methods=['POST'], url_path='add-categories')
     def add_categories(self, request, pk=None):
         article = self.get_object()
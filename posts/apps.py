@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        from django.db.models.signals import post_delete
+        from financial_social_media.caching import track_changes
+        from .models import CommunityMember, invalidate_memberships
+        track_changes('posts.Post', 'posts.Comment', 'posts.Community', 'posts.CommunityMember')
+        post_delete.connect(
+            invalidate_memberships, sender=CommunityMember, dispatch_uid='community-memberships-delete',
+        )
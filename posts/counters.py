@@ -0,0 +1,214 @@
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from financial_social_media.caching import bump_object_version, bump_version
+
+from reactions.models import PostReaction
+from .models import Community, CommunityMember, Post, Comment
+
+REACTION_COUNT_FIELDS = {
+    reaction_type: f'{reaction_type}_count'
+    for reaction_type, _ in PostReaction.REACTION_TYPES
+}
+
+
+def adjust_counters(model, pk, **deltas):
+    """
+    Apply counter deltas to one row in a single atomic UPDATE.
+
+    Decrements are clamped at zero so a drifted counter can't violate
+    the PositiveIntegerField check; `recount_counters` repairs drift.
+    """
+    updates = {}
+    for field, delta in deltas.items():
+        if delta > 0:
+            updates[field] = F(field) + delta
+        elif delta < 0:
+            updates[field] = Greatest(F(field) + delta, 0)
+    if updates:
+        model.objects.filter(pk=pk).update(**updates)
+        bump_version(model._meta.label)
+
+
+def adjust_post_counters(post_id, **deltas):
+    adjust_counters(Post, post_id, **deltas)
+
+
+def adjust_comment_counters(comment_id, **deltas):
+    adjust_counters(Comment, comment_id, **deltas)
+
+
+def adjust_many_post_counters(deltas_by_post):
+    """
+    Apply `{post_id: {field: delta}}` to many posts in a single
+    UPDATE ... FROM (VALUES ...), clamping at zero like adjust_counters.
+    """
+    deltas_by_post = {
+        post_id: deltas for post_id, deltas in deltas_by_post.items() if any(deltas.values())
+    }
+    if not deltas_by_post:
+        return
+    fields = sorted({field for deltas in deltas_by_post.values() for field in deltas})
+    row = '(%s' + ', %s' * len(fields) + ')'
+    params = []
+    for post_id in sorted(deltas_by_post):
+        params.append(post_id)
+        params.extend(deltas_by_post[post_id].get(field, 0) for field in fields)
+    sql = f"""
+        UPDATE {Post._meta.db_table} AS p
+        SET {', '.join(f'{field} = GREATEST(p.{field} + v.{field}, 0)' for field in fields)}
+        FROM (VALUES {', '.join([row] * len(deltas_by_post))}) AS v (id, {', '.join(fields)})
+        WHERE p.id = v.id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+    bump_version(Post._meta.label)
+
+
+def reaction_deltas(old_type, new_type):
+    """
+    Counter deltas for a user's reaction on a post going from `old_type`
+    to `new_type`, where None means no reaction.
+    """
+    deltas = {}
+    if old_type == new_type:
+        return deltas
+    if old_type is None:
+        deltas['reactions_count'] = 1
+    elif new_type is None:
+        deltas['reactions_count'] = -1
+    if old_type is not None:
+        deltas[REACTION_COUNT_FIELDS[old_type]] = -1
+    if new_type is not None:
+        deltas[REACTION_COUNT_FIELDS[new_type]] = 1
+    return deltas
+
+
+def apply_reaction_changes(changes):
+    """
+    Fold `(post_id, old_type, new_type)` reaction changes into per-post
+    counter deltas and apply them in one statement.
+    """
+    deltas = defaultdict(Counter)
+    for post_id, old_type, new_type in changes:
+        deltas[post_id].update(reaction_deltas(old_type, new_type))
+    adjust_many_post_counters(deltas)
+
+
+def write_reactions(reactions):
+    """
+    Apply `{(post_id, user_id): reaction_type}` in bulk, where a None
+    type removes the reaction, together with the counter deltas.
+    Returns the written reactions and the ids of posts that lost one.
+    """
+    with transaction.atomic():
+        written = PostReaction.objects.bulk_upsert(
+            (post_id, user_id, reaction_type)
+            for (post_id, user_id), reaction_type in reactions.items() if reaction_type
+        )
+        removed = PostReaction.objects.bulk_remove(
+            key for key, reaction_type in reactions.items() if not reaction_type
+        )
+        apply_reaction_changes(
+            [(reaction.post_id, old_type, reaction.reaction_type) for reaction, old_type in written]
+            + [(post_id, old_type, None) for post_id, old_type in removed]
+        )
+    return [reaction for reaction, _ in written], sorted(post_id for post_id, _ in removed)
+
+
+def recount(model, fields, child_model, child_key, aggregates, params=(),
+            start=None, stop=None, dry_run=False):
+    """
+    Recompute denormalized counters on `model` from `child_model` rows in
+    one set-based statement and return the number of rows that had drifted.
+
+    `aggregates` are SQL expressions, one per field, evaluated over the
+    child rows grouped by `child_key`. When `start`/`stop` are given only
+    parent ids in `[start, stop)` are touched, and the GROUP BY only reads
+    the matching slice of the child table. With `dry_run` the drift is
+    counted but nothing is written.
+    """
+    table = model._meta.db_table
+    parent_range = child_range = ''
+    range_params = []
+    if start is not None:
+        parent_range = 'AND t.id >= %s AND t.id < %s'
+        child_range = f'WHERE {child_key} >= %s AND {child_key} < %s'
+        range_params = [start, stop]
+    counted = f"""
+        SELECT t.id, {', '.join(f'COALESCE(s.{field}, 0) AS {field}' for field in fields)}
+        FROM {table} AS t
+        LEFT JOIN (
+            SELECT {child_key} AS parent_id,
+                   {', '.join(f'{aggregate} AS {field}' for field, aggregate in zip(fields, aggregates))}
+            FROM {child_model._meta.db_table}
+            {child_range}
+            GROUP BY {child_key}
+        ) AS s ON s.parent_id = t.id
+        WHERE ({', '.join(f't.{field}' for field in fields)})
+              IS DISTINCT FROM
+              ({', '.join(f'COALESCE(s.{field}, 0)' for field in fields)})
+          {parent_range}
+    """
+    if dry_run:
+        sql = f'SELECT COUNT(*) FROM ({counted}) AS drifted'
+    else:
+        sql = f"""
+            UPDATE {table} AS p
+            SET {', '.join(f'{field} = c.{field}' for field in fields)}
+            FROM ({counted}) AS c
+            WHERE p.id = c.id
+            RETURNING p.id
+        """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, *range_params, *range_params])
+        if dry_run:
+            return cursor.fetchone()[0]
+        repaired = [pk for pk, in cursor.fetchall()]
+    if repaired:
+        bump_version(model._meta.label)
+        for pk in repaired:
+            bump_object_version(model._meta.label, pk)
+    return len(repaired)
+
+
+def recount_comments(**kwargs):
+    """
+    Recompute posts' comments_count.
+    """
+    return recount(Post, ['comments_count'], Comment, 'post_id', ['COUNT(*)'], **kwargs)
+
+
+def recount_replies(**kwargs):
+    """
+    Recompute comments' reply_count.
+    """
+    return recount(
+        Comment, ['reply_count'], Comment, 'parent_comment_id', ['COUNT(*)'], **kwargs,
+    )
+
+
+def recount_reactions(**kwargs):
+    """
+    Recompute posts' reactions_count and per-type histogram.
+    """
+    fields = ['reactions_count', *REACTION_COUNT_FIELDS.values()]
+    aggregates = ['COUNT(*)'] + [
+        'COUNT(*) FILTER (WHERE reaction_type = %s)' for _ in REACTION_COUNT_FIELDS
+    ]
+    return recount(
+        Post, fields, PostReaction, 'post_id', aggregates,
+        params=list(REACTION_COUNT_FIELDS), **kwargs,
+    )
+
+
+def recount_members(**kwargs):
+    """
+    Recompute communities' member_count.
+    """
+    return recount(
+        Community, ['member_count'], CommunityMember, 'community_id', ['COUNT(*)'], **kwargs,
+    )
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from posts.counters import (
+    recount_comments, recount_members, recount_reactions, recount_replies,
+)
+from posts.models import Comment, Community, Post
+
+# (label, model whose id range is walked, recount function)
+RECOUNTS = [
+    ('community members', Community, recount_members),
+    ('post comments', Post, recount_comments),
+    ('post reactions', Post, recount_reactions),
+    ('comment replies', Comment, recount_replies),
+]
+
+
+class Command(BaseCommand):
+    help = 'Repair drift in the denormalized member, post and comment counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Number of ids recounted per statement (default: 10000)',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report how many rows have drifted without writing',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+        for label, model, recount in RECOUNTS:
+            bounds = model.objects.aggregate(low=Min('id'), high=Max('id'))
+            if bounds['low'] is None:
+                self.stdout.write(f'{label}: nothing to recount')
+                continue
+            low, high = bounds['low'], bounds['high'] + 1
+            drifted = 0
+            for start in range(low, high, chunk_size):
+                stop = min(start + chunk_size, high)
+                # Each chunk commits on its own so locks are held briefly
+                with transaction.atomic():
+                    drifted += recount(start=start, stop=stop, dry_run=dry_run)
+                done = (stop - low) * 100 // (high - low)
+                self.stdout.write(f'{label}: {done}% ({drifted} drifted)', ending='\r')
+                self.stdout.flush()
+            verb = 'would repair' if dry_run else 'repaired'
+            self.stdout.write(self.style.SUCCESS(f'{label}: {verb} {drifted} rows'))
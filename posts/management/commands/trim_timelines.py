@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Trim every home timeline to TIMELINE_MAX_LENGTH entries'
+
+    def handle(self, *args, **kwargs):
+        removed = TimelineEntry.objects.trim()
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} timeline entries'))
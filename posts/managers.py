@@ -0,0 +1,288 @@
+# posts/managers.py
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, models, transaction
+from django.db.models.expressions import RawSQL
+
+
+class CommentManager(models.Manager):
+    """
+    Reads comment previews and threads.
+    """
+
+    @property
+    def preview_size(self):
+        return getattr(settings, 'COMMENT_PREVIEW_SIZE', 3)
+
+    def preview(self, post=None):
+        """
+        The latest top-level comments, newest first, cut to
+        COMMENT_PREVIEW_SIZE. As a Prefetch queryset the cut applies per
+        post: Django loads a whole page's previews in one ROW_NUMBER()
+        window query.
+        """
+        queryset = self.filter(parent_comment__isnull=True)
+        if post is not None:
+            queryset = queryset.filter(post=post)
+        return queryset.select_related('user').order_by('-created_at', '-id')[:self.preview_size]
+
+    def thread(self, post_id, parent_id=None, after=None, limit=20, replies=3, depth=3):
+        """
+        Return one page of a post's comment tree.
+
+        The page starts with up to `limit` comments directly under
+        `parent_id` (top-level comments when None), oldest first, after the
+        `(created_at, id)` position `after`. Under each of them come at most
+        `replies` replies per comment, down to `depth` levels. One more
+        first-level comment is included, without replies, so the caller can
+        tell whether there is a next page.
+
+        Every level is a LIMITed range read on comment_thread_idx, so the
+        cost depends on the page shape, not on the size of the discussion.
+        """
+        table = self.model._meta.db_table
+        params = [limit, post_id]
+        if parent_id is None:
+            parent_filter = 'parent_comment_id IS NULL'
+        else:
+            parent_filter = 'parent_comment_id = %s'
+            params.append(parent_id)
+        position = ''
+        if after is not None:
+            position = 'AND (created_at, id) > (%s, %s)'
+            params.extend(after)
+        params.extend([limit + 1, post_id, replies, depth])
+        sql = f"""
+            WITH RECURSIVE thread AS (
+                (SELECT id, 1 AS level,
+                        ROW_NUMBER() OVER (ORDER BY created_at, id) > %s AS lookahead
+                 FROM {table}
+                 WHERE post_id = %s AND {parent_filter} {position}
+                 ORDER BY created_at, id
+                 LIMIT %s)
+              UNION ALL
+                SELECT reply.id, thread.level + 1, false
+                FROM thread
+                CROSS JOIN LATERAL (
+                    SELECT id FROM {table}
+                    WHERE post_id = %s AND parent_comment_id = thread.id
+                    ORDER BY created_at, id
+                    LIMIT %s
+                ) AS reply
+                WHERE thread.level < %s AND NOT thread.lookahead
+            )
+            SELECT id FROM thread
+        """
+        return self.filter(pk__in=RawSQL(sql, params))
+
+
+class CommunityMemberManager(models.Manager):
+    """
+    Adds a per-user cached view of community memberships.
+
+    `for_user` answers "which communities is this user in, and with what
+    role" from the cache. CommunityMember.save and every delete (cascades
+    and queryset deletes included, via a post_delete receiver) invalidate
+    it, so visibility filtering and role checks don't need their own
+    queries. Bulk updates and raw SQL bypass that; the cache then lags by
+    up to `cache_timeout`.
+    """
+    cache_timeout = 60 * 5
+    moderator_roles = ('admin', 'moderator')
+
+    @staticmethod
+    def cache_key(user_id):
+        return f'community-memberships:{user_id}'
+
+    def for_user(self, user):
+        """
+        Return `{community_id: role}` for the user's memberships.
+        """
+        if not user.is_authenticated:
+            return {}
+        key = self.cache_key(user.pk)
+        memberships = cache.get(key)
+        if memberships is None:
+            memberships = dict(
+                self.filter(user_id=user.pk).values_list('community_id', 'role')
+            )
+            cache.set(key, memberships, self.cache_timeout)
+        return memberships
+
+    def is_moderator(self, user, community_id):
+        return self.for_user(user).get(community_id) in self.moderator_roles
+
+    def invalidate(self, user_id):
+        """
+        Drop the user's cached memberships now and again on commit, so a
+        concurrent read of the old rows can't cache them past the write.
+        """
+        key = self.cache_key(user_id)
+        cache.delete(key)
+        transaction.on_commit(lambda: cache.delete(key))
+
+
+class TimelineManager(models.Manager):
+    """
+    Fan-out-on-write home timelines.
+
+    Posts in communities with at most TIMELINE_FANOUT_MEMBER_LIMIT members
+    are copied into every member's timeline when they are created. Posts
+    in bigger communities are not copied; `read` merges them in at read
+    time instead (fan-out-on-read). A post whose community or visibility
+    is edited is fanned out again (`refan`), and a community shrinking
+    back to the limit has its latest posts copied to every member
+    (`refill`).
+    """
+
+    @property
+    def fanout_member_limit(self):
+        return getattr(settings, 'TIMELINE_FANOUT_MEMBER_LIMIT', 5000)
+
+    @property
+    def max_length(self):
+        return getattr(settings, 'TIMELINE_MAX_LENGTH', 500)
+
+    def fans_out(self, community):
+        return community.member_count <= self.fanout_member_limit
+
+    def _tables(self):
+        return (
+            self.model._meta.db_table,
+            apps.get_model('posts', 'Post')._meta.db_table,
+            apps.get_model('posts', 'CommunityMember')._meta.db_table,
+        )
+
+    def fan_out(self, post):
+        """
+        Push a new post into its community members' timelines with a
+        single INSERT ... SELECT. Returns the number of entries written.
+        """
+        if post.community_id is None or post.visibility == 'private':
+            return 0
+        if not self.fans_out(post.community):
+            return 0
+        timeline_table, _, member_table = self._tables()
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {timeline_table} (user_id, post_id, community_id, created_at)
+                SELECT user_id, %s, community_id, %s
+                FROM {member_table}
+                WHERE community_id = %s
+                ON CONFLICT (user_id, post_id) DO NOTHING
+            """, [post.pk, post.created_at, post.community_id])
+            return cursor.rowcount
+
+    def refan(self, post):
+        """
+        Replace an edited post's entries, after its community or
+        visibility changed. Returns the number of entries written.
+        """
+        self.filter(post_id=post.pk).delete()
+        return self.fan_out(post)
+
+    def refill(self, community):
+        """
+        Copy a community's latest posts into every member's timeline, once
+        it is small enough to fan out again: posts written while it was
+        larger were only ever merged in at read time.
+        """
+        if not self.fans_out(community):
+            return 0
+        timeline_table, post_table, member_table = self._tables()
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {timeline_table} (user_id, post_id, community_id, created_at)
+                SELECT m.user_id, p.id, p.community_id, p.created_at
+                FROM {member_table} AS m
+                CROSS JOIN (
+                    SELECT id, community_id, created_at
+                    FROM {post_table}
+                    WHERE community_id = %s AND visibility <> 'private'
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                ) AS p
+                WHERE m.community_id = %s
+                ON CONFLICT (user_id, post_id) DO NOTHING
+            """, [community.pk, self.max_length, community.pk])
+            return cursor.rowcount
+
+    def backfill(self, user_id, community):
+        """
+        Seed a new member's timeline with the community's latest posts.
+        """
+        if not self.fans_out(community):
+            return 0
+        timeline_table, post_table, _ = self._tables()
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {timeline_table} (user_id, post_id, community_id, created_at)
+                SELECT %s, id, community_id, created_at
+                FROM {post_table}
+                WHERE community_id = %s AND visibility <> 'private'
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+                ON CONFLICT (user_id, post_id) DO NOTHING
+            """, [user_id, community.pk, self.max_length])
+            return cursor.rowcount
+
+    def read(self, user, before=None, limit=20):
+        """
+        Read the next `limit` entries of a user's home timeline, newest
+        first, starting after the `(created_at, post_id)` position
+        `before`. Returns `(post_ids, position)`: the distinct post ids,
+        and the position of the last entry read, or None when the
+        timeline has nothing after it.
+
+        Fanned-out entries come from one range read on the timeline index.
+        Posts from the user's large communities are merged in with a second
+        range read in the same statement.
+        """
+        post_model = apps.get_model('posts', 'Post')
+        member_model = apps.get_model('posts', 'CommunityMember')
+
+        entries = self.filter(user=user)
+        large = post_model.objects.filter(
+            community__in=member_model.objects.filter(
+                user=user,
+                community__member_count__gt=self.fanout_member_limit,
+            ).values('community'),
+        ).exclude(visibility='private')
+        if before is not None:
+            stamp, pk = before
+            entries = entries.filter(
+                models.Q(created_at__lte=stamp),
+                models.Q(created_at__lt=stamp) | models.Q(post_id__lt=pk),
+            )
+            large = large.filter(
+                models.Q(created_at__lte=stamp),
+                models.Q(created_at__lt=stamp) | models.Q(id__lt=pk),
+            )
+
+        entries = entries.order_by('-created_at', '-post_id').values_list('post_id', 'created_at')
+        large = large.order_by('-created_at', '-id').values_list('id', 'created_at')
+        merged = entries[:limit].union(large[:limit], all=True).order_by('-created_at', '-post_id')
+        rows = list(merged[:limit])
+        position = (rows[-1][1], rows[-1][0]) if len(rows) == limit else None
+        # A community that outgrew the limit can appear in both halves
+        return list(dict.fromkeys(post_id for post_id, _ in rows)), position
+
+    def trim(self):
+        """
+        Cap every timeline at TIMELINE_MAX_LENGTH entries, dropping the
+        oldest, in one set-based DELETE. Returns the number removed.
+        """
+        timeline_table, _, _ = self._tables()
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                DELETE FROM {timeline_table} AS t
+                USING (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY user_id ORDER BY created_at DESC, post_id DESC
+                    ) AS position
+                    FROM {timeline_table}
+                ) AS ranked
+                WHERE t.id = ranked.id AND ranked.position > %s
+            """, [self.max_length])
+            return cursor.rowcount
@@ -0,0 +1,83 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+BACKFILL_COUNTERS = """
+    UPDATE posts_post AS p
+    SET comments_count = COALESCE(c.total, 0)
+    FROM (
+        SELECT post_id, COUNT(*) AS total
+        FROM posts_comment
+        GROUP BY post_id
+    ) AS c
+    WHERE c.post_id = p.id;
+
+    UPDATE posts_post AS p
+    SET reactions_count = r.total,
+        like_count = r.likes,
+        love_count = r.loves,
+        insight_count = r.insights,
+        disagree_count = r.disagrees,
+        surprised_count = r.surprises
+    FROM (
+        SELECT post_id,
+               COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE reaction_type = 'like') AS likes,
+               COUNT(*) FILTER (WHERE reaction_type = 'love') AS loves,
+               COUNT(*) FILTER (WHERE reaction_type = 'insight') AS insights,
+               COUNT(*) FILTER (WHERE reaction_type = 'disagree') AS disagrees,
+               COUNT(*) FILTER (WHERE reaction_type = 'surprised') AS surprises
+        FROM reactions_postreaction
+        GROUP BY post_id
+    ) AS r
+    WHERE r.post_id = p.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_comment_comment_created_id_idx_and_more'),
+        ('reactions', '0003_postreaction_reaction_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='disagree_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='insight_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='love_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reactions_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='surprised_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        # New columns start at zero, so only posts with rows need updating
+        migrations.RunSQL(BACKFILL_COUNTERS, migrations.RunSQL.noop),
+    ]
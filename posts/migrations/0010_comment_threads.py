@@ -0,0 +1,41 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:49
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+BACKFILL_REPLY_COUNTS = """
+    UPDATE posts_comment AS c
+    SET reply_count = r.total
+    FROM (
+        SELECT parent_comment_id, COUNT(*) AS total
+        FROM posts_comment
+        WHERE parent_comment_id IS NOT NULL
+        GROUP BY parent_comment_id
+    ) AS r
+    WHERE r.parent_comment_id = c.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('posts', '0009_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(BACKFILL_REPLY_COUNTS, migrations.RunSQL.noop),
+        AddIndexConcurrently(
+            model_name='comment',
+            index=models.Index(fields=['post', 'parent_comment', 'created_at', 'id'], name='comment_thread_idx'),
+        ),
+    ]
@@ -1,5 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from financial_social_media.caching import bump_object_version, bump_version
+from .managers import CommentManager, CommunityMemberManager, TimelineManager
 
 class Community(models.Model):
     name = models.CharField(max_length=100)
@@ -69,6 +75,35 @@ class Post(models.Model):
         default='public'
     )
 
+    # Engagement counters, maintained with atomic F() updates by the
+    # comment and reaction write paths (see posts.counters)
+    comments_count = models.PositiveIntegerField(default=0)
+    reactions_count = models.PositiveIntegerField(default=0)
+    like_count = models.PositiveIntegerField(default=0)
+    love_count = models.PositiveIntegerField(default=0)
+    insight_count = models.PositiveIntegerField(default=0)
+    disagree_count = models.PositiveIntegerField(default=0)
+    surprised_count = models.PositiveIntegerField(default=0)
+
+    # Full-text index of `content`, computed by Postgres on every write
+    search_vector = models.GeneratedField(
+        expression=SearchVector('content', config='english'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            # Backs keyset pagination on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='post_created_id_idx'),
+            GinIndex(fields=['search_vector'], name='post_search_vector_idx'),
+            # PostViewSet filters, newest first
+            models.Index(fields=['community', 'created_at', 'id'], name='post_community_created_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='post_user_created_idx'),
+            models.Index(fields=['visibility', 'created_at', 'id'], name='post_visibility_created_idx'),
+            models.Index(fields=['post_type', 'created_at', 'id'], name='post_type_created_idx'),
+        ]
+
     def __str__(self):
         return f"Post by {self.user.username}"
 
@@ -92,6 +127,25 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized number of direct replies, kept in step on comment
+    # create/delete and repaired by `recount_counters`
+    reply_count = models.PositiveIntegerField(default=0)
+
+    objects = CommentManager()
+
+    class Meta:
+        indexes = [
+            # Backs keyset pagination on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='comment_created_id_idx'),
+            # A post's comments in order (prefetches, threads)
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_idx'),
+            # One level of a thread: a parent's replies in order
+            models.Index(
+                fields=['post', 'parent_comment', 'created_at', 'id'],
+                name='comment_thread_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"Comment by {self.user.username}"
 
@@ -118,26 +172,99 @@ class CommunityMember(models.Model):
     )
     joined_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CommunityMemberManager()
+
     class Meta:
         unique_together = ('community', 'user')
+        indexes = [
+            # A user's memberships and roles, answered from the index alone
+            models.Index(
+                fields=['user', 'community'],
+                include=['role'],
+                name='member_user_community_idx',
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         """
         Override save method to update community member count.
+
+        This is the only place a join is counted: the membership row and
+        an atomic `member_count + 1` commit together.
         """
         is_new = self._state.adding
-        super().save(*args, **kwargs)
-        
-        if is_new:
-            self.community.update_member_count()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                self.adjust_member_count(F('member_count') + 1)
+                TimelineEntry.objects.backfill(self.user_id, self.community)
+        CommunityMember.objects.invalidate(self.user_id)
 
     def delete(self, *args, **kwargs):
         """
         Override delete method to update community member count.
         """
-        community = self.community
-        super().delete(*args, **kwargs)
-        community.update_member_count()
+        with transaction.atomic():
+            deleted = super().delete(*args, **kwargs)
+            self.adjust_member_count(Greatest(F('member_count') - 1, 0))
+            TimelineEntry.objects.filter(
+                user_id=self.user_id, community_id=self.community_id
+            ).delete()
+            # Back down to the fan-out limit: its posts stop being merged
+            # in at read time, so copy the latest into members' timelines
+            community = Community.objects.only('member_count').get(pk=self.community_id)
+            if community.member_count == TimelineEntry.objects.fanout_member_limit:
+                TimelineEntry.objects.refill(community)
+        # The cached memberships are dropped by invalidate_memberships
+        return deleted
+
+    def adjust_member_count(self, expression):
+        Community.objects.filter(pk=self.community_id).update(member_count=expression)
+        # .update() sends no signals, so refresh the community's version
+        # stamps (and cached fragments) by hand
+        bump_version('posts.Community')
+        bump_object_version('posts.Community', self.community_id)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.community.name}"
+
+
+def invalidate_memberships(sender, instance, **kwargs):
+    """
+    post_delete receiver for CommunityMember: also covers cascades and
+    queryset deletes, which skip CommunityMember.delete.
+    """
+    CommunityMember.objects.invalidate(instance.user_id)
+
+class TimelineEntry(models.Model):
+    """
+    A post pushed into a member's home timeline. `created_at` copies the
+    post's timestamp so a feed page is one range read on the user index.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, 
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    post = models.ForeignKey(
+        Post, 
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    community = models.ForeignKey(
+        Community, 
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    created_at = models.DateTimeField()
+
+    objects = TimelineManager()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'post'], name='timeline_user_created_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} - {self.community.name}"
\ No newline at end of file
+        return f"{self.post_id} in {self.user_id}'s timeline"
@@ -0,0 +1,83 @@
+# posts/pagination.py
+from collections import defaultdict
+
+from rest_framework.pagination import _positive_int
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from news.pagination import KeysetPagination
+
+
+class CommentThreadPagination(KeysetPagination):
+    """
+    Cursor pagination over a comment tree, oldest first.
+
+    Each level of the tree pages on its own: the response's `next` link
+    continues the comments at the top of the page, and every comment with
+    replies that were not loaded carries a `more_replies` link that pages
+    through that comment's own replies (`?parent=<id>&cursor=...`).
+    `replies` caps the replies loaded per comment and `depth` the number
+    of levels.
+    """
+    ordering = ('created_at', 'id')
+    parent_query_param = 'parent'
+    replies_query_param = 'replies'
+    depth_query_param = 'depth'
+    default_replies = 3
+    max_replies = 20
+    default_depth = 3
+    max_depth = 10
+
+    def get_int_param(self, request, name, default, maximum=None):
+        try:
+            return _positive_int(request.query_params[name], strict=True, cutoff=maximum)
+        except (KeyError, ValueError):
+            return default
+
+    def paginate_thread(self, fetch, request):
+        """
+        Build one page of a thread from the comments returned by
+        `fetch(parent_id, position, limit, replies, depth)`, which must
+        yield them ordered by `(created_at, id)` and include one extra
+        first-level comment when there is a next page.
+        """
+        self.cursor_mode = True
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        limit = self.get_page_size(request)
+        replies = self.get_int_param(
+            request, self.replies_query_param, self.default_replies, self.max_replies,
+        )
+        depth = self.get_int_param(
+            request, self.depth_query_param, self.default_depth, self.max_depth,
+        )
+        parent_id = self.get_int_param(request, self.parent_query_param, None)
+        position, _ = self.decode_cursor(request)
+
+        children = defaultdict(list)
+        for comment in fetch(parent_id, position, limit, replies, depth):
+            children[comment.parent_comment_id].append(comment)
+
+        roots = children[parent_id]
+        self.has_next, self.has_previous = len(roots) > limit, False
+        self.page = roots[:limit]
+        for comment in self.page:
+            self.attach_replies(comment, children, 1)
+        return self.page
+
+    def attach_replies(self, comment, children, level):
+        comment.depth = level
+        comment.thread_replies = children.get(comment.id, [])
+        for reply in comment.thread_replies:
+            self.attach_replies(reply, children, level + 1)
+        comment.more_replies = None
+        if comment.reply_count > len(comment.thread_replies):
+            comment.more_replies = self.get_replies_link(comment)
+
+    def get_replies_link(self, comment):
+        url = replace_query_param(self.base_url, self.parent_query_param, comment.id)
+        url = remove_query_param(url, self.cursor_query_param)
+        if not comment.thread_replies:
+            return url
+        return self.encode_cursor(
+            self.position_of(comment.thread_replies[-1]), reverse=False, url=url,
+        )
@@ -25,15 +25,12 @@ class IsPostVisibleToUser(permissions.BasePermission):
         if obj.visibility == 'private':
             return obj.user == request.user
         
-        # For community posts, check if user is a community member
+        # For community posts, check the user's cached memberships
         if obj.visibility == 'community':
-            if not obj.community:
+            if not obj.community_id:
                 return False
             
             from .models import CommunityMember
-            return CommunityMember.objects.filter(
-                community=obj.community, 
-                user=request.user
-            ).exists()
+            return obj.community_id in CommunityMember.objects.for_user(request.user)
         
         return False
\ No newline at end of file
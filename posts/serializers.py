@@ -1,17 +1,24 @@
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 from django.conf import settings
-from .models import Community, Post, Comment, CommunityMember
+from django.db import transaction
+from .models import Community, Post, Comment, CommunityMember, TimelineEntry
+from .counters import (
+    REACTION_COUNT_FIELDS, adjust_comment_counters, adjust_post_counters, reaction_deltas,
+)
 from django.contrib.auth import get_user_model
 from reactions.models import PostReaction
+from financial_social_media.caching import FragmentCacheMixin, get_object_version
+from reactions.buffer import get_reaction_buffer, write_behind_enabled
 from reactions.serializers import PostReactionSerializer
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(FragmentCacheMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email']
 
-class CommunitySerializer(serializers.ModelSerializer):
+class CommunitySerializer(FragmentCacheMixin, serializers.ModelSerializer):
     creator = UserSerializer(read_only=True)
     creator_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(), 
@@ -30,6 +37,15 @@ class CommunitySerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'community_photo': {'required': False}
         }
+
+    def get_fragment_key_parts(self, instance):
+        # The nested creator, and the photo URL built from the request host
+        request = self.context.get('request')
+        return [
+            get_object_version(User._meta.label, instance.creator_id),
+            request.get_host() if request else '',
+        ]
+
     def create(self, validated_data):
         # If a creator is provided in the context (typically from frontend), use that
         creator = validated_data.get('creator') or self.context['request'].user
@@ -81,8 +97,31 @@ class CommentSerializer(serializers.ModelSerializer):
         # Update validated_data with the user
         validated_data['user'] = user
         
-        # Create the comment
-        return Comment.objects.create(**validated_data)
+        # Create the comment and bump the post's counter together
+        with transaction.atomic():
+            comment = Comment.objects.create(**validated_data)
+            adjust_post_counters(comment.post_id, comments_count=1)
+            if comment.parent_comment_id:
+                adjust_comment_counters(comment.parent_comment_id, reply_count=1)
+        return comment
+
+
+class CommentThreadSerializer(CommentSerializer):
+    """
+    A comment in a thread page, with its loaded replies nested under it.
+    """
+    depth = serializers.IntegerField(read_only=True)
+    replies = serializers.SerializerMethodField()
+    more_replies = serializers.CharField(read_only=True)
+
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + [
+            'reply_count', 'depth', 'replies', 'more_replies',
+        ]
+        read_only_fields = CommentSerializer.Meta.read_only_fields + ['reply_count']
+
+    def get_replies(self, obj):
+        return CommentThreadSerializer(obj.thread_replies, many=True, context=self.context).data
 
 class PostSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
@@ -91,31 +130,120 @@ class PostSerializer(serializers.ModelSerializer):
         source='user', 
         write_only=True
     )
-    comments = CommentSerializer(many=True, read_only=True)
-    comments_count = serializers.SerializerMethodField()
+    comments = serializers.SerializerMethodField()
+    thread_url = serializers.SerializerMethodField()
     reactions = serializers.SerializerMethodField()
-    reactions_count = serializers.SerializerMethodField()  # Add this line
+    reaction_counts = serializers.SerializerMethodField()
+    my_reaction = serializers.SerializerMethodField()
     class Meta:
         model = Post
         fields = [
             'id', 'user', 'user_id', 'community', 
             'content', 'media_urls', 'created_at', 
             'updated_at', 'post_type', 'visibility',
-            'comments','comments_count', 'reactions','reactions_count'  # Add reactions_count here
+            'comments','comments_count', 'thread_url', 'reactions','reactions_count',
+            'reaction_counts', 'my_reaction'
         ]
-        read_only_fields = ['created_at', 'updated_at']
-    
-    def get_comments_count(self, obj):
-        return obj.comments.count()
+        read_only_fields = [
+            'created_at', 'updated_at', 'comments_count', 'reactions_count'
+        ]
+
+    def create(self, validated_data):
+        # Push the post into community members' home timelines
+        with transaction.atomic():
+            post = super().create(validated_data)
+            TimelineEntry.objects.fan_out(post)
+        return post
+
+    def update(self, instance, validated_data):
+        # Moving a post, or changing who may see it, changes whose
+        # timelines it belongs in
+        audience = (instance.community_id, instance.visibility)
+        with transaction.atomic():
+            post = super().update(instance, validated_data)
+            if (post.community_id, post.visibility) != audience:
+                TimelineEntry.objects.refan(post)
+        return post
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        pending = self.get_pending_reactions()
+        if instance.pk in pending:
+            self.overlay_pending_reaction(data, instance, pending[instance.pk])
+        return data
+
+    def get_pending_reactions(self):
+        # The requesting user's reactions still in the write-behind buffer,
+        # looked up once per response
+        request = self.context.get('request')
+        if not (write_behind_enabled() and request and request.user.is_authenticated):
+            return {}
+        if 'pending_reactions' not in self.context:
+            self.context['pending_reactions'] = get_reaction_buffer().pending_for(request.user.pk)
+        return self.context['pending_reactions']
+
+    def overlay_pending_reaction(self, data, instance, reaction_type):
+        # Show the user's own unflushed reaction as if it were written
+        user_id = self.context['request'].user.pk
+        stored = [r for r in data['reactions'] if r['user'] == user_id]
+        previous = stored[0]['reaction_type'] if stored else None
+        data['reactions'] = [r for r in data['reactions'] if r['user'] != user_id]
+        if reaction_type:
+            data['reactions'].append({
+                'id': stored[0]['id'] if stored else None,
+                'post': instance.pk,
+                'user': user_id,
+                'reaction_type': reaction_type,
+                'created_at': stored[0]['created_at'] if stored else None,
+            })
+        data['my_reaction'] = reaction_type
+        deltas = reaction_deltas(previous, reaction_type)
+        data['reactions_count'] += deltas.get('reactions_count', 0)
+        for name, field in REACTION_COUNT_FIELDS.items():
+            data['reaction_counts'][name] += deltas.get(field, 0)
+
+    def get_comments(self, obj):
+        # A preview of the latest top-level comments (prefetched for the
+        # whole page by PostViewSet); the full tree is behind thread_url
+        preview = getattr(obj, 'comment_preview', None)
+        if preview is None:
+            preview = Comment.objects.preview(post=obj)
+        return CommentSerializer(preview, many=True, context=self.context).data
+
+    def get_thread_url(self, obj):
+        return reverse('posts-thread', args=[obj.pk], request=self.context.get('request'))
 
     def get_reactions(self, obj):
-        # Get all reactions for this post
-        reactions = PostReaction.objects.filter(post=obj)
-        return PostReactionSerializer(reactions, many=True).data
+        # Get all reactions for this post (prefetched by PostViewSet)
+        return PostReactionSerializer(obj.reactions.all(), many=True).data
+
+    def get_my_reaction(self, obj):
+        # The requesting user's reaction type, or None
+        request = self.context.get('request')
+        if not (request and request.user.is_authenticated):
+            return None
+        viewer_reactions = getattr(obj, 'viewer_reactions', None)
+        if viewer_reactions is None:
+            # Not prefetched by PostViewSet (e.g. a freshly created post)
+            return obj.reactions.filter(user_id=request.user.pk).values_list(
+                'reaction_type', flat=True
+            ).first()
+        return viewer_reactions[0].reaction_type if viewer_reactions else None
 
-    def get_reactions_count(self, obj):
-        # Count the total number of reactions for this post
-        return PostReaction.objects.filter(post=obj).count()
+    def get_reaction_counts(self, obj):
+        # Per-type histogram read from the stored counters
+        return {
+            reaction_type: getattr(obj, field)
+            for reaction_type, field in REACTION_COUNT_FIELDS.items()
+        }
+
+class PostSearchSerializer(PostSerializer):
+    # Only present when the search has a query
+    rank = serializers.FloatField(read_only=True)
+    headline = serializers.CharField(read_only=True)
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ['rank', 'headline']
 
 class CommunityMemberSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
@@ -133,11 +261,7 @@ class CommunityMemberSerializer(serializers.ModelSerializer):
         # Update validated_data with the user
         validated_data['user'] = user
         
-        # Increment community member count
-        community = validated_data['community']
-        community.member_count += 1
-        community.save()
-        
+        # CommunityMember.save counts the new member
         return CommunityMember.objects.create(**validated_data)
 
     def validate(self, data):
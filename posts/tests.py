@@ -1,3 +1,889 @@
-from django.test import TestCase
+import threading
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TransactionTestCase, override_settings
+from reactions.models import PostReaction
+from .counters import recount_comments, recount_reactions, recount_replies
+from .models import Community, Post, Comment, CommunityMember, TimelineEntry
+from .serializers import CommunitySerializer, UserSerializer
+
+User = get_user_model()
+
+
+def make_user(n):
+    user = User.objects.create_user(
+        email=f'user{n}@example.com',
+        username=f'user{n}',
+        id=str(n),
+    )
+    # Reload so the pk has the type the database hands back
+    return User.objects.get(pk=user.pk)
+
+
+# For tests that repeat a request to measure the view itself: a zero
+# timeout stores nothing, so the result cache never answers
+NO_RESULT_CACHE = override_settings(RESULT_CACHE_TIMEOUT=0, RESULT_CACHE_STALE_TIMEOUT=0)
+
+
+class PostsAPITestCase(APITestCase):
+    def setUp(self):
+        # Membership sets and results are cached by user id and path,
+        # which tests reuse
+        cache.clear()
+
+
+class PostQueryBudgetTests(PostsAPITestCase):
+    """
+    The posts list and search must cost the same number of queries
+    whether a page holds one post or a full page of them.
+    """
+    # COUNT for pagination, the page of posts, comments, reactions
+    LIST_QUERIES = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [make_user(n) for n in range(1, 4)]
+        cls.community = Community.objects.create(name='Macro', creator=cls.users[0])
+
+    def create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                user=self.users[i % 3],
+                community=self.community,
+                content=f'Rates outlook number {i}',
+                post_type='text',
+            )
+            for user in self.users:
+                Comment.objects.create(post=post, user=user, content='Agreed')
+                PostReaction.objects.create(post=post, user=user, reaction_type='like')
+        recount_comments()
+        recount_reactions()
+
+    def test_list_query_count_is_constant(self):
+        self.create_posts(1)
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get('/api/posts/')
+        self.assertEqual(response.status_code, 200)
+
+        self.create_posts(15)
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get('/api/posts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 16)
+
+    def test_search_query_count_is_constant(self):
+        self.create_posts(12)
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get('/api/posts/search/', {'q': 'rates'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 12)
+
+    def test_list_reads_counts_and_nested_rows(self):
+        self.create_posts(2)
+        response = self.client.get('/api/posts/')
+        for item in response.data['results']:
+            self.assertEqual(item['comments_count'], 3)
+            self.assertEqual(item['reactions_count'], 3)
+            self.assertEqual(len(item['comments']), 3)
+            self.assertEqual(len(item['reactions']), 3)
+            self.assertEqual(item['comments'][0]['user']['username'][:4], 'user')
+
+    def test_username_filter(self):
+        self.create_posts(3)
+        response = self.client.get('/api/posts/', {'username': 'user2@example.com'})
+        self.assertEqual(response.data['count'], 1)
+        response = self.client.get('/api/posts/', {'username': 'nobody@example.com'})
+        self.assertEqual(response.data['count'], 0)
+
+
+class PostCursorPaginationTests(PostsAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(1)
+        cls.posts = [
+            Post.objects.create(user=cls.user, content=f'Post {i}', post_type='text')
+            for i in range(7)
+        ]
+
+    def walk(self, url, params=None):
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                return ids, response
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_mode_walks_newest_first(self):
+        ids, last = self.walk('/api/posts/', {'pagination': 'cursor', 'page_size': 3})
+        expected = [post.id for post in sorted(
+            self.posts, key=lambda p: (p.created_at, p.id), reverse=True
+        )]
+        self.assertEqual(ids, expected)
+        self.assertNotIn('count', last.data)
+
+        # Walking back from the last page returns the previous page
+        previous = self.client.get(last.data['previous'])
+        self.assertEqual([item['id'] for item in previous.data['results']], expected[3:6])
+
+    @NO_RESULT_CACHE
+    def test_deep_cursor_pages_cost_the_same(self):
+        first = self.client.get('/api/posts/', {'pagination': 'cursor', 'page_size': 2})
+        with self.assertNumQueries(3):
+            self.client.get('/api/posts/', {'pagination': 'cursor', 'page_size': 2})
+        with self.assertNumQueries(3):
+            self.client.get(first.data['next'])
+
+    def test_page_numbers_remain_the_default(self):
+        response = self.client.get('/api/posts/', {'page': 2, 'page_size': 5})
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/posts/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class PostCounterTests(PostsAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other = make_user(1), make_user(2)
+        cls.post = Post.objects.create(user=cls.user, content='Earnings', post_type='text')
+
+    def counters(self):
+        post = Post.objects.get(pk=self.post.pk)
+        return (
+            post.comments_count, post.reactions_count,
+            post.like_count, post.love_count, post.insight_count,
+        )
+
+    def react(self, user, reaction_type):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/reactions/', {
+            'post': self.post.pk, 'user': user.pk, 'reaction_type': reaction_type,
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.data['id']
+
+    def test_comment_create_and_delete(self):
+        response = self.client.post('/api/comments/', {
+            'post': self.post.pk, 'user_id': self.user.pk, 'content': 'Beat',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.counters()[0], 1)
+
+        self.client.delete(f"/api/comments/{response.data['id']}/")
+        self.assertEqual(self.counters()[0], 0)
+
+    def test_reaction_create_change_and_delete(self):
+        self.react(self.user, 'like')
+        reaction_id = self.react(self.other, 'like')
+        self.assertEqual(self.counters(), (0, 2, 2, 0, 0))
+
+        # Changing type moves the count between buckets
+        self.client.patch(f'/api/reactions/{reaction_id}/', {'reaction_type': 'insight'})
+        self.assertEqual(self.counters(), (0, 2, 1, 0, 1))
+
+        self.client.delete(f'/api/reactions/{reaction_id}/')
+        self.assertEqual(self.counters(), (0, 1, 1, 0, 0))
+
+        data = self.client.get(f'/api/posts/{self.post.pk}/').data
+        self.assertEqual(data['reactions_count'], 1)
+        self.assertEqual(data['reaction_counts']['like'], 1)
+
+    def test_my_reaction_is_loaded_for_the_whole_page(self):
+        second = Post.objects.create(user=self.user, content='Guidance', post_type='text')
+        PostReaction.objects.create(post=self.post, user=self.user, reaction_type='insight')
+        PostReaction.objects.create(post=second, user=self.other, reaction_type='like')
+
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/api/posts/').data
+        mine = {item['id']: item['my_reaction'] for item in data['results']}
+        self.assertEqual(mine, {self.post.pk: 'insight', second.pk: None})
+        lookups = [q['sql'] for q in queries if 'reactions_postreaction' in q['sql']]
+        # All reactions for the page, then the viewer's own in one lookup
+        self.assertEqual(len(lookups), 2)
+
+        self.client.force_authenticate(None)
+        data = self.client.get('/api/posts/').data
+        self.assertEqual({item['my_reaction'] for item in data['results']}, {None})
+
+    def test_recount_repairs_drift(self):
+        Comment.objects.create(post=self.post, user=self.user, content='Untracked')
+        PostReaction.objects.create(post=self.post, user=self.user, reaction_type='love')
+        Post.objects.filter(pk=self.post.pk).update(like_count=5)
+
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual(self.counters(), (1, 1, 0, 1, 0))
+
+    def test_recount_dry_run_and_chunks(self):
+        community = Community.objects.create(name='Energy', creator=self.user)
+        CommunityMember.objects.create(community=community, user=self.user)
+        Community.objects.filter(pk=community.pk).update(member_count=7)
+        posts = [
+            Post.objects.create(user=self.user, content=f'Drift {i}', post_type='text')
+            for i in range(3)
+        ]
+        for post in posts:
+            Comment.objects.create(post=post, user=self.user, content='Untracked')
+        Post.objects.filter(pk__in=[post.pk for post in posts]).update(comments_count=0)
+
+        out = StringIO()
+        call_command('recount_counters', '--dry-run', stdout=out)
+        self.assertIn('community members: would repair 1 rows', out.getvalue())
+        self.assertIn('post comments: would repair 3 rows', out.getvalue())
+        community.refresh_from_db()
+        self.assertEqual(community.member_count, 7)
+
+        out = StringIO()
+        call_command('recount_counters', '--chunk-size', '1', stdout=out)
+        self.assertIn('post comments: repaired 3 rows', out.getvalue())
+        community.refresh_from_db()
+        self.assertEqual(community.member_count, 1)
+        self.assertEqual(
+            list(Post.objects.filter(pk__in=[post.pk for post in posts]).values_list('comments_count', flat=True)),
+            [1, 1, 1],
+        )
+
+
+class HomeTimelineTests(PostsAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader, cls.outsider = make_user(1), make_user(2), make_user(3)
+        cls.small = Community.objects.create(name='Options', creator=cls.author)
+        cls.large = Community.objects.create(name='Markets', creator=cls.author)
+        for community in (cls.small, cls.large):
+            for user in (cls.author, cls.reader):
+                CommunityMember.objects.create(community=community, user=user)
+
+    def publish(self, community, content, **fields):
+        self.client.force_authenticate(self.author)
+        response = self.client.post('/api/posts/', {
+            'user_id': self.author.pk, 'community': community.pk,
+            'content': content, 'post_type': 'text', **fields,
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def feed_ids(self, user, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/posts/feed/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']], response
+
+    def test_posts_fan_out_to_members(self):
+        post_id = self.publish(self.small, 'Vol is cheap')
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(post_id=post_id).values_list('user_id', flat=True)),
+            {self.author.pk, self.reader.pk},
+        )
+        self.assertEqual(self.feed_ids(self.reader)[0], [post_id])
+        self.assertEqual(self.feed_ids(self.outsider)[0], [])
+
+    def test_private_posts_are_not_fanned_out(self):
+        self.publish(self.small, 'Note to self', visibility='private')
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    @override_settings(TIMELINE_FANOUT_MEMBER_LIMIT=1)
+    def test_large_communities_are_merged_at_read_time(self):
+        Community.objects.filter(pk=self.small.pk).update(member_count=1)
+        fanned = self.publish(self.small, 'Fanned out')
+        merged = self.publish(self.large, 'Read time')
+        fanned_again = self.publish(self.small, 'Fanned out again')
+
+        self.assertFalse(TimelineEntry.objects.filter(post_id=merged).exists())
+        self.assertTrue(TimelineEntry.objects.filter(post_id=fanned).exists())
+        self.assertEqual(self.feed_ids(self.reader)[0], [fanned_again, merged, fanned])
+
+        ids, response = self.feed_ids(self.reader, page_size=1)
+        ids2 = [item['id'] for item in self.client.get(response.data['next']).data['results']]
+        self.assertEqual(ids + ids2, [fanned_again, merged])
+
+    def test_feed_pages_cost_a_fixed_number_of_queries(self):
+        posts = [self.publish(self.small, f'Post {i}') for i in range(5)]
+        self.client.force_authenticate(self.reader)
+        CommunityMember.objects.for_user(self.reader)
+        # timeline read, posts, comments, reactions, the reader's reactions
+        with self.assertNumQueries(5):
+            first = self.client.get('/api/posts/feed/', {'page_size': 3})
+        with self.assertNumQueries(5):
+            second = self.client.get(first.data['next'])
+        ids = [item['id'] for item in first.data['results'] + second.data['results']]
+        self.assertEqual(ids, posts[::-1])
+        self.assertIsNone(second.data['next'])
+
+    def test_hidden_entries_do_not_cut_the_feed_short(self):
+        posts = [self.publish(self.small, f'Post {i}') for i in range(16)]
+        # Made private after fanning out: their entries stay, hidden
+        Post.objects.filter(pk__in=posts[2:-1]).update(visibility='private')
+
+        # The page is refilled past the hidden entries as far as
+        # max_fetches reads go, then `next` carries on from there
+        ids, response = self.feed_ids(self.reader, page_size=2)
+        self.assertEqual(ids, [posts[-1]])
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            ids.extend(item['id'] for item in response.data['results'])
+        self.assertEqual(ids, [posts[-1], posts[1], posts[0]])
+
+    def test_join_backfills_and_leave_clears(self):
+        post_id = self.publish(self.small, 'Before joining')
+        membership = CommunityMember.objects.create(community=self.small, user=self.outsider)
+        self.assertEqual(self.feed_ids(self.outsider)[0], [post_id])
+
+        membership.delete()
+        self.assertEqual(self.feed_ids(self.outsider)[0], [])
+
+    def test_edited_posts_are_fanned_out_again(self):
+        post_id = self.publish(self.small, 'Moving this')
+        CommunityMember.objects.create(community=self.large, user=self.outsider)
+
+        response = self.client.patch(f'/api/posts/{post_id}/', {'community': self.large.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(post_id=post_id).values_list('user_id', 'community_id')),
+            {(user.pk, self.large.pk) for user in (self.author, self.reader, self.outsider)},
+        )
+        self.assertEqual(self.feed_ids(self.outsider)[0], [post_id])
+
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(f'/api/posts/{post_id}/', {'visibility': 'private'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(TimelineEntry.objects.filter(post_id=post_id).exists())
+
+    @override_settings(TIMELINE_FANOUT_MEMBER_LIMIT=2)
+    def test_communities_shrinking_to_the_limit_are_refilled(self):
+        membership = CommunityMember.objects.create(community=self.large, user=self.outsider)
+        merged = self.publish(self.large, 'Read time')
+        self.assertFalse(TimelineEntry.objects.filter(post_id=merged).exists())
+
+        membership.delete()
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(post_id=merged).values_list('user_id', flat=True)),
+            {self.author.pk, self.reader.pk},
+        )
+        self.assertEqual(self.feed_ids(self.reader)[0], [merged])
+
+    def test_feed_requires_authentication(self):
+        response = self.client.get('/api/posts/feed/')
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_trim_caps_timelines(self):
+        posts = [self.publish(self.small, f'Post {i}') for i in range(4)]
+        call_command('trim_timelines', stdout=StringIO())
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(user=self.reader).values_list('post_id', flat=True)),
+            set(posts[2:]),
+        )
+
+
+class PostFullTextSearchTests(PostsAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(1)
+        cls.community = Community.objects.create(name='Rates', creator=cls.user)
+        cls.best = Post.objects.create(
+            user=cls.user, community=cls.community, post_type='text',
+            content='Bond yields are rising. Rising yields hurt long bonds.',
+        )
+        cls.weaker = Post.objects.create(
+            user=cls.user, post_type='text',
+            content='Equities rallied while yields rise slightly.',
+        )
+        Post.objects.create(user=cls.user, post_type='text', content='Crypto is flat today.')
+
+    def search(self, **params):
+        response = self.client.get('/api/posts/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_matches_stemmed_terms_ranked_by_relevance(self):
+        results = self.search(q='yield rise')
+        self.assertEqual([item['id'] for item in results], [self.best.id, self.weaker.id])
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+        self.assertIn('<mark>', results[0]['headline'])
+
+    def test_combines_with_list_filters(self):
+        results = self.search(q='yields', community_id=self.community.id)
+        self.assertEqual([item['id'] for item in results], [self.best.id])
+        self.assertEqual(self.search(q='yields', post_type='link'), [])
+
+    def test_web_search_syntax(self):
+        results = self.search(q='yields -bonds')
+        self.assertEqual([item['id'] for item in results], [self.weaker.id])
+
+    def test_without_query_lists_newest_first(self):
+        results = self.search()
+        self.assertEqual(len(results), 3)
+        self.assertNotIn('rank', results[0])
+
+    def test_ordering_is_validated(self):
+        results = self.search(q='yields', ordering='created_at')
+        self.assertEqual([item['id'] for item in results], [self.best.id, self.weaker.id])
+        for params in ({'ordering': 'rank'}, {'q': 'yields', 'ordering': 'user__password'}):
+            response = self.client.get('/api/posts/search/', params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('ordering', response.data)
+
+
+class IndexPlanMixin:
+    """
+    `assertIndexed` for test cases checking that hot endpoints need no
+    sequential scan. Seq scans are disabled for the EXPLAIN, so on small
+    seeded tables the planner only picks one when no index applies.
+    """
+    def assertIndexed(self, url, params=None, uses=None):
+        """
+        EXPLAIN every SELECT the request ran; `uses` names an index (or a
+        tuple of acceptable ones) that at least one of them must use.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        plans = []
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            for query in queries.captured_queries:
+                if not query['sql'].lstrip('(').startswith('SELECT'):
+                    continue
+                cursor.execute(f"EXPLAIN {query['sql']}")
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+                self.assertNotIn('Seq Scan', plan, f"{url} {params}\n{query['sql']}\n{plan}")
+                plans.append(plan)
+        if uses:
+            uses = (uses,) if isinstance(uses, str) else uses
+            plans = '\n'.join(plans)
+            self.assertTrue(any(name in plans for name in uses), f'{url} {params}\n{plans}')
+
+
+class IndexPlanTests(IndexPlanMixin, PostsAPITestCase):
+    """
+    Every SELECT behind the hot endpoints must be answerable without a
+    sequential scan.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [make_user(n) for n in range(1, 21)]
+        communities = [
+            Community.objects.create(name=f'Community {n}', creator=cls.users[0])
+            for n in range(10)
+        ]
+        cls.community = communities[0]
+        for i, user in enumerate(cls.users):
+            CommunityMember.objects.create(community=communities[i % 10], user=user)
+        for i in range(300):
+            post = Post.objects.create(
+                user=cls.users[i % 20],
+                community=communities[i % 10],
+                content=f'Inflation print {i}' if i % 10 == 0 else f'Earnings call {i}',
+                post_type='link' if i % 15 == 0 else 'text',
+                visibility='community' if i % 12 == 0 else 'public',
+            )
+            Comment.objects.create(post=post, user=cls.users[0], content='Hot')
+            PostReaction.objects.create(post=post, user=cls.users[1], reaction_type='like')
+        cls.post = post
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_post_endpoints(self):
+        cursor = {'pagination': 'cursor'}
+        self.assertIndexed('/api/posts/', cursor, uses='post_created_id_idx')
+
+        # A member, so visibility becomes a three-way OR
+        self.client.force_authenticate(self.users[0])
+        self.assertIndexed(
+            '/api/posts/', {'community_id': self.community.pk, **cursor},
+            uses=('post_community_created_idx', 'posts_post_community_id'),
+        )
+        self.assertIndexed(
+            '/api/posts/', {'username': 'user2@example.com', **cursor},
+            uses=('post_user_created_idx', 'posts_post_user_id'),
+        )
+        self.assertIndexed(
+            '/api/posts/', {'visibility': 'community', **cursor},
+            uses='post_visibility_created_idx',
+        )
+        self.assertIndexed(
+            '/api/posts/', {'post_type': 'link', **cursor},
+            uses='post_type_created_idx',
+        )
+        self.assertIndexed('/api/posts/', cursor)
+        self.assertIndexed('/api/posts/search/', {'q': 'inflation'}, uses='post_search_vector_idx')
+        self.assertIndexed(f'/api/posts/{self.post.pk}/')
+        self.assertIndexed('/api/posts/feed/', uses='timeline_user_created_idx')
+
+    def test_comment_member_and_reaction_endpoints(self):
+        self.assertIndexed('/api/comments/', {'pagination': 'cursor'}, uses='comment_created_id_idx')
+        self.assertIndexed('/api/community-members/', {'community_id': self.community.pk})
+        self.assertIndexed('/api/reactions/', {'post_id': self.post.pk, 'pagination': 'cursor'})
+
+
+class PostVisibilityTests(PostsAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.member, cls.outsider = make_user(1), make_user(2), make_user(3)
+        cls.community = Community.objects.create(name='Desk', creator=cls.author)
+        CommunityMember.objects.create(community=cls.community, user=cls.author, role='admin')
+        CommunityMember.objects.create(community=cls.community, user=cls.member)
+        cls.public = Post.objects.create(user=cls.author, content='Public', post_type='text')
+        cls.private = Post.objects.create(
+            user=cls.author, content='Private', post_type='text', visibility='private',
+        )
+        cls.members_only = Post.objects.create(
+            user=cls.author, community=cls.community, content='Members',
+            post_type='text', visibility='community',
+        )
+
+    def visible_to(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/posts/')
+        return {item['id'] for item in response.data['results']}
+
+    def test_visibility_rules(self):
+        self.assertEqual(self.visible_to(None), {self.public.id})
+        self.assertEqual(self.visible_to(self.outsider), {self.public.id})
+        self.assertEqual(self.visible_to(self.member), {self.public.id, self.members_only.id})
+        self.assertEqual(
+            self.visible_to(self.author),
+            {self.public.id, self.private.id, self.members_only.id},
+        )
+        self.client.force_authenticate(self.outsider)
+        response = self.client.get(f'/api/posts/{self.members_only.id}/')
+        self.assertEqual(response.status_code, 404)
+
+    @NO_RESULT_CACHE
+    def test_membership_set_is_cached_and_invalidated(self):
+        self.client.force_authenticate(self.outsider)
+        # Cold: one extra query loads the membership set; the fifth warm
+        # query is the viewer's own reactions
+        with self.assertNumQueries(6):
+            self.client.get('/api/posts/')
+        with self.assertNumQueries(5):
+            self.client.get('/api/posts/')
+
+        membership = CommunityMember.objects.create(community=self.community, user=self.outsider)
+        self.assertIn(self.members_only.id, self.visible_to(self.outsider))
+        membership.delete()
+        self.assertNotIn(self.members_only.id, self.visible_to(self.outsider))
+
+    def test_cascade_and_queryset_deletes_invalidate_memberships(self):
+        other = Community.objects.create(name='Rates', creator=self.outsider)
+        for community in (self.community, other):
+            CommunityMember.objects.create(community=community, user=self.outsider)
+        self.assertEqual(set(CommunityMember.objects.for_user(self.outsider)), {self.community.pk, other.pk})
+
+        other.delete()
+        self.assertEqual(set(CommunityMember.objects.for_user(self.outsider)), {self.community.pk})
+        CommunityMember.objects.filter(user=self.outsider).delete()
+        self.assertEqual(CommunityMember.objects.for_user(self.outsider), {})
+
+    def test_role_checks_use_the_cached_set(self):
+        CommunityMember.objects.for_user(self.member)
+        self.client.force_authenticate(self.member)
+        # Only the community lookup; the role comes from the cache
+        with self.assertNumQueries(1):
+            response = self.client.delete(f'/api/communities/{self.community.pk}/remove_photo/')
+        self.assertEqual(response.status_code, 403)
+
+        membership = CommunityMember.objects.get(community=self.community, user=self.member)
+        membership.role = 'moderator'
+        membership.save()
+        response = self.client.delete(f'/api/communities/{self.community.pk}/remove_photo/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_anonymous_user_is_not_the_creator_of_an_orphaned_community(self):
+        orphaned = Community.objects.create(name='Orphaned')
+        response = self.client.delete(f'/api/communities/{orphaned.pk}/remove_photo/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_memberships_are_invalidated_again_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CommunityMember.objects.create(community=self.community, user=self.outsider)
+            # A concurrent read of the not yet committed rows
+            cache.set(CommunityMember.objects.cache_key(self.outsider.pk), {}, 300)
+        self.assertIn(self.community.pk, CommunityMember.objects.for_user(self.outsider))
+
+
+class CommentThreadTests(PostsAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(1)
+        cls.post = Post.objects.create(user=cls.user, content='Guidance', post_type='text')
+        comment = lambda parent=None: Comment.objects.create(
+            post=cls.post, user=cls.user, parent_comment=parent, content='Reply',
+        )
+        cls.roots = [comment() for _ in range(3)]
+        cls.replies = [comment(cls.roots[0]) for _ in range(4)]
+        cls.grandchild = comment(cls.replies[0])
+        cls.leaf = comment(cls.grandchild)
+        recount_replies()
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_thread_is_paged_per_level(self):
+        url = f'/api/posts/{self.post.pk}/thread/'
+        # The post lookup and the recursive thread query
+        with self.assertNumQueries(2):
+            data = self.get(url, page_size=2, replies=2, depth=3)
+
+        self.assertEqual([c['id'] for c in data['results']], [r.id for r in self.roots[:2]])
+        self.assertIsNotNone(data['next'])
+        first = data['results'][0]
+        self.assertEqual(first['reply_count'], 4)
+        self.assertEqual([c['id'] for c in first['replies']], [r.id for r in self.replies[:2]])
+
+        # The third level is loaded, the fourth is left behind a link
+        grandchild = first['replies'][0]['replies'][0]
+        self.assertEqual((grandchild['id'], grandchild['depth']), (self.grandchild.id, 3))
+        self.assertEqual(grandchild['replies'], [])
+        deeper = self.get(grandchild['more_replies'])
+        self.assertEqual([c['id'] for c in deeper['results']], [self.leaf.id])
+
+        more = self.get(first['more_replies'])
+        self.assertEqual([c['id'] for c in more['results']], [r.id for r in self.replies[2:]])
+        self.assertIsNone(more['next'])
+
+        rest = self.get(data['next'])
+        self.assertEqual([c['id'] for c in rest['results']], [self.roots[2].id])
+
+    @override_settings(COMMENT_PREVIEW_SIZE=2)
+    def test_post_embeds_a_bounded_preview(self):
+        other = Post.objects.create(user=self.user, content='Quiet', post_type='text')
+        Comment.objects.create(post=other, user=self.user, content='Only one')
+
+        data = self.get('/api/posts/')
+        previews = {item['id']: item for item in data['results']}
+        self.assertEqual(
+            [c['id'] for c in previews[self.post.pk]['comments']],
+            [self.roots[2].id, self.roots[1].id],
+        )
+        self.assertEqual(len(previews[other.pk]['comments']), 1)
+        self.assertTrue(previews[self.post.pk]['thread_url'].endswith(f'/api/posts/{self.post.pk}/thread/'))
+
+    def test_reply_count_follows_create_and_delete(self):
+        response = self.client.post('/api/comments/', {
+            'post': self.post.pk, 'user_id': self.user.pk,
+            'parent_comment_id': self.roots[1].pk, 'content': 'Late',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.roots[1].refresh_from_db()
+        self.assertEqual(self.roots[1].reply_count, 1)
+
+        self.client.delete(f"/api/comments/{response.data['id']}/")
+        self.roots[1].refresh_from_db()
+        self.assertEqual(self.roots[1].reply_count, 0)
+
+
+class ConditionalGetTests(PostsAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other = make_user(1), make_user(2)
+        cls.post = Post.objects.create(user=cls.user, content='Payrolls', post_type='text')
+
+    def test_unchanged_list_is_not_modified(self):
+        first = self.client.get('/api/posts/')
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'].startswith('W/"'))
+        self.assertIn('Last-Modified', first)
+        self.assertIn('Authorization', first['Vary'])
+
+        # Answered from the version stamps alone
+        with self.assertNumQueries(0):
+            again = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], first['ETag'])
+
+        detail = self.client.get(f'/api/posts/{self.post.pk}/')
+        self.assertNotEqual(detail['ETag'], first['ETag'])
+
+    def test_writes_and_viewers_change_the_etag(self):
+        etag = self.client.get('/api/posts/')['ETag']
+
+        self.client.post('/api/comments/', {
+            'post': self.post.pk, 'user_id': self.user.pk, 'content': 'Strong',
+        })
+        response = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # Raw SQL writes bump the stamps too
+        PostReaction.objects.upsert(self.post.pk, self.other.pk, 'like')
+        response = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        self.client.force_authenticate(self.other)
+        response = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(RESULT_CACHE_WAIT=0.1)
+    def test_hidden_post_is_never_served_stale(self):
+        self.client.force_authenticate(self.other)
+        url = f'/api/posts/{self.post.pk}/'
+        view = self.client.get(url).renderer_context['view']
+        token, _ = view.get_version_token(view.request)
+        _, stale, lock = view.get_result_keys(view.request, token)
+        self.assertIsNone(cache.get(stale))
+
+        post = Post.objects.get(pk=self.post.pk)
+        post.visibility = 'private'
+        post.save()
+        # Another worker is recomputing; the follower must not fall back
+        # on the last 200 it saw
+        cache.add(lock, 'other-worker', 10)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class FragmentCacheTests(PostsAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user(1)
+        cls.community = Community.objects.create(name='Commodities', creator=cls.author)
+        for i in range(3):
+            Post.objects.create(user=cls.author, content=f'Crude {i}', post_type='text')
+
+    def count_renders(self, serializer_class, request):
+        original = serializers.ModelSerializer.to_representation
+        with mock.patch.object(
+            serializers.ModelSerializer, 'to_representation', autospec=True, side_effect=original,
+        ) as spy:
+            response = request()
+        renders = sum(isinstance(call.args[0], serializer_class) for call in spy.call_args_list)
+        return renders, response
+
+    def test_author_renders_once_until_it_changes(self):
+        renders, _ = self.count_renders(UserSerializer, lambda: self.client.get('/api/posts/'))
+        self.assertEqual(renders, 1)
+        renders, _ = self.count_renders(
+            UserSerializer, lambda: self.client.get('/api/posts/', {'page_size': 2}),
+        )
+        self.assertEqual(renders, 0)
+
+        self.author.username = 'renamed'
+        self.author.save()
+        renders, response = self.count_renders(UserSerializer, lambda: self.client.get('/api/posts/'))
+        self.assertEqual(renders, 1)
+        self.assertEqual(response.data['results'][0]['user']['username'], 'renamed')
+
+    def test_community_fragment_follows_members_and_photo(self):
+        def render():
+            return CommunitySerializer(Community.objects.get(pk=self.community.pk)).data
+
+        self.assertEqual(render()['member_count'], 0)
+        CommunityMember.objects.create(community=self.community, user=self.author)
+        self.assertEqual(render()['member_count'], 1)
+
+        community = Community.objects.get(pk=self.community.pk)
+        community.community_photo = 'community_photos/oil.png'
+        community.save()
+        self.assertTrue(render()['community_photo'].endswith('oil.png'))
+
+    @override_settings(ALLOWED_HOSTS=['api.example.com', 'testserver'])
+    def test_community_fragment_follows_creator_and_host(self):
+        community = Community.objects.get(pk=self.community.pk)
+        community.community_photo = 'community_photos/oil.png'
+        community.save()
+
+        def render(host):
+            request = APIRequestFactory().get('/', HTTP_HOST=host)
+            community = Community.objects.get(pk=self.community.pk)
+            return CommunitySerializer(community, context={'request': request}).data
+
+        self.assertTrue(render('api.example.com')['community_photo'].startswith('http://api.example.com/'))
+        self.assertTrue(render('testserver')['community_photo'].startswith('http://testserver/'))
+
+        self.author.username = 'renamed'
+        self.author.save()
+        self.assertEqual(render('testserver')['creator']['username'], 'renamed')
+
+
+class CommunityMemberCountTests(PostsAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, cls.joiner = make_user(1), make_user(2)
+        cls.community = Community.objects.create(name='Credit', creator=cls.owner)
+
+    def member_count(self):
+        self.community.refresh_from_db()
+        return self.community.member_count
+
+    def test_join_and_leave_count_once(self):
+        self.client.force_authenticate(self.joiner)
+        response = self.client.post(
+            '/api/community-members/join_community/', {'community_id': self.community.pk},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.member_count(), 1)
+
+        response = self.client.post(
+            '/api/community-members/join_community/', {'community_id': self.community.pk},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.member_count(), 1)
+
+        membership = CommunityMember.objects.get(community=self.community, user=self.joiner)
+        response = self.client.delete(f'/api/community-members/{membership.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.member_count(), 0)
+
+
+class CommunityMemberConcurrencyTests(TransactionTestCase):
+    """
+    Joins and leaves running in parallel transactions must leave
+    member_count equal to the number of membership rows.
+    """
+    WORKERS = 12
+
+    def run_concurrently(self, work, items):
+        barrier = threading.Barrier(len(items))
+        errors = []
+
+        def worker(item):
+            try:
+                barrier.wait()
+                work(item)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(item,)) for item in items]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_parallel_joins_and_leaves_are_exact(self):
+        users = [make_user(n) for n in range(1, self.WORKERS + 1)]
+        community = Community.objects.create(name='Rates', creator=users[0])
+
+        self.run_concurrently(
+            lambda user: CommunityMember.objects.create(community=community, user=user),
+            users,
+        )
+        community.refresh_from_db()
+        self.assertEqual(community.member_count, self.WORKERS)
+
+        leaving = list(CommunityMember.objects.filter(community=community)[:self.WORKERS // 2])
+        self.run_concurrently(lambda membership: membership.delete(), leaving)
+        community.refresh_from_db()
+        self.assertEqual(community.member_count, self.WORKERS - len(leaving))
+        self.assertEqual(
+            community.member_count,
+            CommunityMember.objects.filter(community=community).count(),
+        )
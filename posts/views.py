@@ -1,28 +1,38 @@
-from django.db.models import Q 
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Prefetch
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import viewsets, permissions, status
-from .models import Community, Post, Comment, CommunityMember
+from rest_framework.generics import get_object_or_404
+from .models import Community, Post, Comment, CommunityMember, TimelineEntry
 from .serializers import (
     CommunitySerializer, 
     PostSerializer, 
+    PostSearchSerializer,
     CommentSerializer,
+    CommentThreadSerializer,
     CommunityMemberSerializer
 )
 from .permissions import IsOwnerOrReadOnly, IsPostVisibleToUser
+from news.pagination import CreatedAtKeysetPagination
+from reactions.models import PostReaction
+from .pagination import CommentThreadPagination
 
+from .counters import adjust_comment_counters, adjust_post_counters
 from drf_spectacular.utils import extend_schema
+from financial_social_media.caching import CachedResultMixin
 from django.contrib.auth import get_user_model
 from rest_framework.parsers import MultiPartParser, FormParser
 User = get_user_model()
 
 
 
-
 @extend_schema(tags=['Communities'])
-class CommunityViewSet(viewsets.ModelViewSet):
+class CommunityViewSet(CachedResultMixin, viewsets.ModelViewSet):
     queryset = Community.objects.all()
     serializer_class = CommunitySerializer
+    version_models = ('posts.Community', 'posts.CommunityMember', 'users.CustomUser')
    #permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     parser_classes = [MultiPartParser, FormParser]  # Add support for file uploads
     
@@ -38,12 +48,8 @@ class CommunityViewSet(viewsets.ModelViewSet):
         community = self.get_object()
         
         # Check if the current user is the creator or an admin
-        is_creator = community.creator == request.user
-        is_admin = CommunityMember.objects.filter(
-            community=community, 
-            user=request.user, 
-            role__in=['admin', 'moderator']
-        ).exists()
+        is_creator = request.user.is_authenticated and community.creator_id == request.user.pk
+        is_admin = CommunityMember.objects.is_moderator(request.user, community.pk)
         
         if not (is_creator or is_admin):
             return Response(
@@ -88,12 +94,8 @@ class CommunityViewSet(viewsets.ModelViewSet):
         community = self.get_object()
         
         # Check if the current user is the creator or an admin
-        is_creator = community.creator == request.user
-        is_admin = CommunityMember.objects.filter(
-            community=community, 
-            user=request.user, 
-            role__in=['admin', 'moderator']
-        ).exists()
+        is_creator = request.user.is_authenticated and community.creator_id == request.user.pk
+        is_admin = CommunityMember.objects.is_moderator(request.user, community.pk)
         
         if not (is_creator or is_admin):
             return Response(
@@ -113,7 +115,7 @@ class CommunityViewSet(viewsets.ModelViewSet):
         )
 
 @extend_schema(tags=['Posts'])
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(CachedResultMixin, viewsets.ModelViewSet):
     # queryset = Post.objects.all()
     # serializer_class = PostSerializer
     # permission_classes = [permissions.IsAuthenticatedOrReadOnly,IsOwnerOrReadOnly, 
@@ -136,10 +138,26 @@ class PostViewSet(viewsets.ModelViewSet):
 
     queryset = Post.objects.all()
     serializer_class = PostSerializer
+    pagination_class = CreatedAtKeysetPagination
+    # Everything a post representation or its visibility depends on
+    version_models = (
+        'posts.Post', 'posts.Comment', 'posts.CommunityMember',
+        'reactions.PostReaction', 'users.CustomUser',
+    )
     #permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly, IsPostVisibleToUser]
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        # Load everything PostSerializer renders up front so a page costs
+        # a fixed number of queries regardless of its size (the counts are
+        # stored on Post itself). Comments are a bounded preview, so the
+        # payload doesn't grow with the discussion. The tsvector is only
+        # needed inside SQL.
+        queryset = super().get_queryset().select_related('user').defer(
+            'search_vector'
+        ).prefetch_related(
+            Prefetch('comments', queryset=Comment.objects.preview(), to_attr='comment_preview'),
+            'reactions',
+        )
         
         # Filtering parameters
         community_id = self.request.query_params.get('community_id')
@@ -147,31 +165,34 @@ class PostViewSet(viewsets.ModelViewSet):
         visibility = self.request.query_params.get('visibility')
         post_type = self.request.query_params.get('post_type')
         
-        # Base visibility filtering for authenticated/non-authenticated users
-        # if self.request.user.is_authenticated:
-            
-        #     queryset = queryset.filter(
-        #         Q(visibility='public') | 
-        #         Q(visibility='private', user=self.request.user) |
-        #         Q(visibility='community', community__in=self.request.user.community_set.all())
-        #     )
-        # else:
-            
-        #     queryset = queryset.filter(visibility='public')
+        # Base visibility filtering for authenticated/non-authenticated users.
+        # Community ids come from the cached membership set, so this is a
+        # plain IN list rather than a subquery or an extra query.
+        user = self.request.user
+        if user.is_authenticated:
+            # The viewer's own reaction for every post on the page, in one
+            # `post_id IN (...) AND user_id = ?` query (PostSerializer.my_reaction)
+            queryset = queryset.prefetch_related(Prefetch(
+                'reactions',
+                queryset=PostReaction.objects.filter(user_id=user.pk),
+                to_attr='viewer_reactions',
+            ))
+            community_ids = list(CommunityMember.objects.for_user(user))
+            queryset = queryset.filter(
+                Q(visibility='public') | 
+                Q(user_id=user.pk) |
+                Q(visibility='community', community_id__in=community_ids)
+            )
+        else:
+            queryset = queryset.filter(visibility='public')
 
         # Additional filtering options
         if community_id:
             queryset = queryset.filter(community_id=community_id)
         
         if username:
-            
-            try:
-                user = User.objects.get(email=username)
-                queryset = queryset.filter(user=user)
-            except User.DoesNotExist:
-                # Return empty queryset if user not found
-                print ("doesn't exit")
-                return Post.objects.none()
+            # Unknown users simply match no posts
+            queryset = queryset.filter(user__email=username)
         
         if visibility:
             queryset = queryset.filter(visibility=visibility)
@@ -181,26 +202,38 @@ class PostViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    def get_serializer_class(self):
+        if self.action == 'search':
+            return PostSearchSerializer
+        return super().get_serializer_class()
+
     @action(detail=False, methods=['GET'])
     def search(self, request):
         """
         Custom search action with multiple filtering options
         Query params:
-        - q: search term (searches in title and content)
-        - community_id: filter by community
-        - username: filter by user
+        - q: full-text search over content (web search syntax: "quoted
+          phrases", or, -excluded); results are ranked by relevance and
+          carry a highlighted `headline`
+        - community_id, username, visibility, post_type: as for the list
         - min_date: minimum creation date
         - max_date: maximum creation date
-        - tags: comma-separated list of tags
+        - ordering: created_at or rank (with `q`), either way round;
+          defaults to -rank when searching, else -created_at
+        - pagination=cursor: keyset pages (ignores `ordering`)
         """
         queryset = self.get_queryset()
         
-        # Search term
+        # Search term, matched against the GIN-indexed search_vector
         search_query = request.query_params.get('q','')
         if search_query:
-            queryset = queryset.filter(
-              
-                Q(content__icontains=search_query)
+            query = SearchQuery(search_query, config='english', search_type='websearch')
+            queryset = queryset.filter(search_vector=query).annotate(
+                rank=SearchRank(F('search_vector'), query),
+                headline=SearchHeadline(
+                    'content', query, config='english',
+                    start_sel='<mark>', stop_sel='</mark>', max_fragments=2,
+                ),
             )
         
         # Date range filtering
@@ -213,15 +246,18 @@ class PostViewSet(viewsets.ModelViewSet):
         if max_date:
             queryset = queryset.filter(created_at__lte=max_date)
         
-        # Multiple tag filtering
-        tags = request.query_params.get('tags')
-        if tags:
-            tag_list = tags.split(',')
-            queryset = queryset.filter(tags__name__in=tag_list)
-        
-        # Ordering
-        ordering = request.query_params.get('ordering', '-created_at')
-        queryset = queryset.order_by(ordering)
+        # Ordering; rank only exists when searching
+        default_ordering = '-rank' if search_query else '-created_at'
+        ordering = request.query_params.get('ordering', default_ordering)
+        allowed = {'created_at', '-created_at'}
+        if search_query:
+            allowed |= {'rank', '-rank'}
+        if ordering not in allowed:
+            return Response(
+                {'ordering': f'Must be one of: {", ".join(sorted(allowed))}.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        queryset = queryset.order_by(ordering, '-id')
         
         # Pagination
         page = self.paginate_queryset(queryset)
@@ -232,15 +268,64 @@ class PostViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['GET'], permission_classes=[permissions.IsAuthenticated])
+    def feed(self, request):
+        """
+        Home timeline of the current user across all their communities,
+        newest first, paged with the `next` cursor link.
+        """
+        queryset = self.get_queryset()
+
+        def fetch(position, limit):
+            post_ids, position = TimelineEntry.objects.read(request.user, before=position, limit=limit)
+            posts = queryset.in_bulk(post_ids)
+            return [posts[pk] for pk in post_ids if pk in posts], position
+
+        paginator = CreatedAtKeysetPagination()
+        page = paginator.paginate_source(fetch, request)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['GET'])
+    def thread(self, request, pk=None):
+        """
+        The post's comments as a tree, oldest first. `depth` limits the
+        levels returned and `replies` the replies per comment; follow a
+        comment's `more_replies` link to page through the rest.
+        """
+        # Only visibility matters here, not what PostSerializer renders
+        queryset = self.get_queryset().select_related(None).prefetch_related(None).only('id')
+        post = get_object_or_404(queryset, pk=pk)
+        self.check_object_permissions(request, post)
+
+        def fetch(parent_id, position, limit, replies, depth):
+            return Comment.objects.thread(
+                post.pk, parent_id=parent_id, after=position,
+                limit=limit, replies=replies, depth=depth,
+            ).select_related('user').order_by('created_at', 'id')
+
+        paginator = CommentThreadPagination()
+        page = paginator.paginate_thread(fetch, request)
+        serializer = CommentThreadSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
 @extend_schema(tags=['Comments'])
 class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    pagination_class = CreatedAtKeysetPagination
     #permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
     #def perform_create(self, serializer):
        # serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            adjust_post_counters(instance.post_id, comments_count=-1)
+            if instance.parent_comment_id:
+                adjust_comment_counters(instance.parent_comment_id, reply_count=-1)
+
 @extend_schema(tags=['Community-Members'])
 class CommunityMemberViewSet(viewsets.ModelViewSet):
     queryset = CommunityMember.objects.all()
@@ -268,10 +353,17 @@ class CommunityMemberViewSet(viewsets.ModelViewSet):
         if community.is_private:
             return Response({'detail': 'This is a private community. Request to join is required.'}, status=403)
         
-        # Create membership
-        serializer = self.get_serializer(data={'community': community_id})
+        # Create membership; the row and the member count commit together
+        serializer = self.get_serializer(
+            data={'community': community_id, 'user': request.user.pk}
+        )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            # A concurrent join by the same user won the unique constraint
+            return Response({'detail': 'You are already a member of this community.'}, status=400)
         
         return Response(serializer.data, status=201)
 
@@ -279,18 +371,10 @@ class CommunityMemberViewSet(viewsets.ModelViewSet):
         instance = self.get_object()
         
         # Only allow leaving or removal by community admin or the member themselves
-        if (instance.user != request.user and 
-            not CommunityMember.objects.filter(
-                community=instance.community, 
-                user=request.user, 
-                role__in=['admin', 'moderator']
-            ).exists()):
+        if (instance.user_id != request.user.pk and 
+            not CommunityMember.objects.is_moderator(request.user, instance.community_id)):
             return Response({'detail': 'Not authorized to remove this member.'}, status=403)
         
-        # Decrement community member count
-        community = instance.community
-        community.member_count -= 1
-        community.save()
-        
+        # CommunityMember.delete decrements the member count atomically
         self.perform_destroy(instance)
         return Response(status=204)
\ No newline at end of file
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ReactionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reactions'
+
+    def ready(self):
+        from financial_social_media.caching import track_changes
+        track_changes('reactions.PostReaction')
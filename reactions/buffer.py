@@ -0,0 +1,180 @@
+# reactions/buffer.py
+import atexit
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from financial_social_media.caching import bump_version
+from posts.counters import write_reactions
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+
+class ReactionBuffer(ABC):
+    """
+    Write-behind store for reactions.
+
+    With REACTION_WRITE_BEHIND on, a reaction is acknowledged as soon as
+    it is buffered. Entries are keyed by `(post_id, user_id)`, so a burst
+    of changes by one user on one post collapses to the last one (None
+    meaning "removed"). `flush` writes everything pending with one bulk
+    upsert, one bulk delete and one counter update.
+
+    Subclasses provide the storage: `add`, `pending_for`, `drain` and
+    `restore`.
+    """
+
+    @abstractmethod
+    def add(self, post_id, user_id, reaction_type):
+        """
+        Store a reaction change, replacing any pending one for the pair.
+        """
+
+    def buffer(self, post_id, user_id, reaction_type):
+        """
+        Buffer a reaction change. Reads overlay the user's pending
+        reactions, so cached representations are invalidated right away.
+        """
+        self.add(post_id, user_id, reaction_type)
+        bump_version('reactions.PostReaction')
+
+    @abstractmethod
+    def pending_for(self, user_id):
+        """
+        Return `{post_id: reaction_type}` of a user's unflushed reactions.
+        """
+
+    @abstractmethod
+    def drain(self):
+        """
+        Remove and return everything pending as
+        `{(post_id, user_id): reaction_type}`.
+        """
+
+    @abstractmethod
+    def restore(self, pending):
+        """
+        Put back drained entries that failed to flush, keeping any newer
+        ones added in the meantime.
+        """
+
+    def flush(self):
+        """
+        Apply everything pending and return the number of entries written.
+        Entries whose post or user has been deleted since are dropped, so
+        they can't fail every later flush on the foreign keys.
+        """
+        pending = drop_orphans(self.drain())
+        if not pending:
+            return 0
+        try:
+            write_reactions(pending)
+        except Exception:
+            self.restore(pending)
+            raise
+        return len(pending)
+
+
+def drop_orphans(pending):
+    """
+    The entries of `pending` whose post and user both still exist.
+    """
+    if not pending:
+        return pending
+    post_ids = set(Post.objects.filter(
+        pk__in={post_id for post_id, _ in pending},
+    ).values_list('pk', flat=True))
+    user_ids = set(get_user_model().objects.filter(
+        pk__in={user_id for _, user_id in pending},
+    ).values_list('pk', flat=True))
+    kept = {
+        (post_id, user_id): reaction_type
+        for (post_id, user_id), reaction_type in pending.items()
+        if post_id in post_ids and user_id in user_ids
+    }
+    if len(kept) < len(pending):
+        logger.info('Dropped %d buffered reactions to deleted posts or users', len(pending) - len(kept))
+    return kept
+
+
+class LocalReactionBuffer(ReactionBuffer):
+    """
+    In-process buffer, for a single worker, development and tests only.
+    With several workers each keeps its own unflushed reactions, so a
+    user's pending reaction (and `my_reaction`) depends on which worker
+    answers; use a buffer shared between processes there.
+
+    When REACTION_FLUSH_INTERVAL is set, a daemon thread flushes it every
+    that many seconds; it is also flushed when the process exits.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.flusher = None
+        atexit.register(self.flush)
+
+    def add(self, post_id, user_id, reaction_type):
+        with self.lock:
+            self.entries[post_id, user_id] = reaction_type
+        self.start()
+
+    def pending_for(self, user_id):
+        with self.lock:
+            return {
+                post_id: reaction_type
+                for (post_id, entry_user_id), reaction_type in self.entries.items()
+                if entry_user_id == user_id
+            }
+
+    def drain(self):
+        with self.lock:
+            entries, self.entries = self.entries, {}
+        return entries
+
+    def restore(self, pending):
+        with self.lock:
+            self.entries = {**pending, **self.entries}
+
+    def start(self):
+        interval = getattr(settings, 'REACTION_FLUSH_INTERVAL', None)
+        if interval is None or self.flusher is not None:
+            return
+        self.flusher = threading.Thread(target=self.run, args=(interval,), daemon=True)
+        self.flusher.start()
+
+    def run(self, interval):
+        stopped = threading.Event()
+        while not stopped.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing buffered reactions failed')
+            finally:
+                connection.close()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def write_behind_enabled():
+    return getattr(settings, 'REACTION_WRITE_BEHIND', False)
+
+
+def get_reaction_buffer():
+    """
+    Return the process-wide buffer built from REACTION_BUFFER.
+    """
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            path = getattr(settings, 'REACTION_BUFFER', 'reactions.buffer.LocalReactionBuffer')
+            _buffer = import_string(path)()
+        return _buffer
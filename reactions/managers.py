@@ -0,0 +1,120 @@
+# reactions/managers.py
+from django.db import connection, models, transaction
+
+from financial_social_media.caching import bump_version
+
+
+class ConcurrentInsert(Exception):
+    """
+    A row the upsert updated was inserted by a transaction that committed
+    after the statement's snapshot, so its previous type is unknown.
+    """
+
+
+class PostReactionManager(models.Manager):
+    """
+    Writes reactions with one INSERT ... ON CONFLICT DO UPDATE.
+
+    The statement also reads each row's previous reaction_type (locking
+    the existing rows) so callers can apply exact counter deltas without
+    a separate SELECT.
+    """
+    max_retries = 3
+
+    def upsert(self, post_id, user_id, reaction_type):
+        """
+        Set one user's reaction on a post. Returns `(reaction, old_type)`,
+        where old_type is None for a new reaction.
+        """
+        return self.bulk_upsert([(post_id, user_id, reaction_type)])[0]
+
+    def bulk_upsert(self, reactions):
+        """
+        Set many `(post_id, user_id, reaction_type)` reactions in one
+        statement; the last entry wins for a repeated (post, user).
+        Returns `(reaction, old_type)` pairs ordered by (post_id, user_id).
+        """
+        latest = {(post_id, user_id): reaction_type for post_id, user_id, reaction_type in reactions}
+        if not latest:
+            return []
+        rows = sorted((post_id, user_id, reaction_type) for (post_id, user_id), reaction_type in latest.items())
+        for attempt in range(self.max_retries):
+            try:
+                # A savepoint, so a lost race can be retried on a fresh snapshot
+                with transaction.atomic():
+                    return self._upsert(rows)
+            except ConcurrentInsert:
+                if attempt == self.max_retries - 1:
+                    raise
+
+    def _upsert(self, rows):
+        table = self.model._meta.db_table
+        values = ', '.join(['(%s, %s, %s)'] * len(rows))
+        # `incoming` borrows its column types from the table through the
+        # UNION. The INSERT reads from `previous`, so each existing row is
+        # locked and its old type read before the upsert rewrites it.
+        sql = f"""
+            WITH incoming AS (
+                SELECT post_id, user_id, reaction_type FROM {table} WHERE false
+                UNION ALL VALUES {values}
+            ),
+            previous AS (
+                SELECT r.post_id, r.user_id, r.reaction_type
+                FROM {table} AS r
+                JOIN incoming AS i ON i.post_id = r.post_id AND i.user_id = r.user_id
+                ORDER BY r.post_id, r.user_id
+                FOR UPDATE OF r
+            ),
+            written AS (
+                INSERT INTO {table} AS r (post_id, user_id, reaction_type, created_at)
+                SELECT i.post_id, i.user_id, i.reaction_type, now()
+                FROM incoming AS i
+                LEFT JOIN previous AS p ON p.post_id = i.post_id AND p.user_id = i.user_id
+                ORDER BY i.post_id, i.user_id
+                ON CONFLICT (post_id, user_id)
+                DO UPDATE SET reaction_type = EXCLUDED.reaction_type
+                RETURNING r.id, r.post_id, r.user_id, r.reaction_type, r.created_at,
+                          r.xmax = 0 AS inserted
+            )
+            SELECT w.id, w.post_id, w.user_id, w.reaction_type, w.created_at,
+                   w.inserted, p.reaction_type
+            FROM written AS w
+            LEFT JOIN previous AS p ON p.post_id = w.post_id AND p.user_id = w.user_id
+            ORDER BY w.post_id, w.user_id
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [value for row in rows for value in row])
+            results = cursor.fetchall()
+        bump_version(self.model._meta.label)
+
+        written = []
+        for pk, post_id, user_id, reaction_type, created_at, inserted, old_type in results:
+            if not inserted and old_type is None:
+                raise ConcurrentInsert
+            reaction = self.model(
+                id=pk, post_id=post_id, user_id=user_id,
+                reaction_type=reaction_type, created_at=created_at,
+            )
+            reaction._state.adding = False
+            written.append((reaction, old_type))
+        return written
+
+    def bulk_remove(self, pairs):
+        """
+        Delete the reactions for `(post_id, user_id)` pairs in one
+        statement. Returns the removed `(post_id, reaction_type)` pairs.
+        """
+        pairs = sorted(set(pairs))
+        if not pairs:
+            return []
+        table = self.model._meta.db_table
+        keys = ', '.join(['(%s, %s)'] * len(pairs))
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                DELETE FROM {table}
+                WHERE (post_id, user_id) IN ({keys})
+                RETURNING post_id, reaction_type
+            """, [value for pair in pairs for value in pair])
+            removed = cursor.fetchall()
+        bump_version(self.model._meta.label)
+        return removed
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:37
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('posts', '0005_comment_comment_created_id_idx_and_more'),
+        ('reactions', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='postreaction',
+            index=models.Index(fields=['created_at', 'id'], name='reaction_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:43
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('posts', '0009_hot_query_indexes'),
+        ('reactions', '0003_postreaction_reaction_created_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='postreaction',
+            index=models.Index(fields=['post', 'reaction_type'], name='reaction_post_type_idx'),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.conf import settings
 from posts.models import Post
 
+from .managers import PostReactionManager
+
 class PostReaction(models.Model):
     REACTION_TYPES = [
         ('like', 'Like'),
@@ -26,6 +28,14 @@ class PostReaction(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = PostReactionManager()
+
     class Meta:
         unique_together = ('post', 'user')
+        indexes = [
+            # Backs keyset pagination on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='reaction_created_id_idx'),
+            # Per-type counts for a post
+            models.Index(fields=['post', 'reaction_type'], name='reaction_post_type_idx'),
+        ]
 
@@ -1,32 +1,83 @@
 from rest_framework import serializers
+from django.db import transaction
 from .models import PostReaction
+from posts.models import Post
+from posts.counters import adjust_post_counters, reaction_deltas, write_reactions
 
 class PostReactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = PostReaction
         fields = ['id', 'post', 'user', 'reaction_type', 'created_at']
         read_only_fields = [ 'created_at']
+        # A repeated (post, user) updates the existing reaction instead
+        validators = []
 
     def create(self, validated_data):
         # Automatically set the user to the current authenticated user
-        
         user = validated_data.get('user') or self.context['request'].user
-        validated_data['user'] = user
-        # Check if user has already reacted to the post
-        existing_reaction = PostReaction.objects.filter(
-            post=validated_data['post'], 
-            user=validated_data['user']
-        ).first()
-        
-        if existing_reaction:
-            # If reaction exists, update the existing reaction
-            existing_reaction.reaction_type = validated_data['reaction_type']
-            existing_reaction.save()
-            return existing_reaction
-        
-        # Create a new reaction
-        return PostReaction.objects.create(**validated_data)
+        with transaction.atomic():
+            # Insert or change the user's reaction in one statement
+            reaction, old_type = PostReaction.objects.upsert(
+                validated_data['post'].pk, user.pk, validated_data['reaction_type'],
+            )
+            adjust_post_counters(
+                reaction.post_id,
+                **reaction_deltas(old_type, reaction.reaction_type)
+            )
+        return reaction
+
+    def update(self, instance, validated_data):
+        old_post_id, old_type = instance.post_id, instance.reaction_type
+        with transaction.atomic():
+            reaction = super().update(instance, validated_data)
+            if reaction.post_id == old_post_id:
+                adjust_post_counters(
+                    reaction.post_id,
+                    **reaction_deltas(old_type, reaction.reaction_type)
+                )
+            else:
+                adjust_post_counters(old_post_id, **reaction_deltas(old_type, None))
+                adjust_post_counters(
+                    reaction.post_id,
+                    **reaction_deltas(None, reaction.reaction_type)
+                )
+        return reaction
 
     def validate(self, data):
         # Additional validation if needed
-        return data
\ No newline at end of file
+        return data
+
+
+class ReactionBatchItemSerializer(serializers.Serializer):
+    post = serializers.IntegerField()
+    # null removes the reaction
+    reaction_type = serializers.ChoiceField(choices=PostReaction.REACTION_TYPES, allow_null=True)
+
+
+class ReactionBatchSerializer(serializers.Serializer):
+    """
+    Many reactions by the requesting user, applied in order; a later entry
+    for the same post wins.
+    """
+    max_batch_size = 500
+
+    reactions = ReactionBatchItemSerializer(many=True, allow_empty=False)
+
+    def validate_reactions(self, reactions):
+        if len(reactions) > self.max_batch_size:
+            raise serializers.ValidationError(
+                f'At most {self.max_batch_size} reactions per batch.'
+            )
+        post_ids = {item['post'] for item in reactions}
+        missing = post_ids - set(Post.objects.filter(pk__in=post_ids).values_list('pk', flat=True))
+        if missing:
+            raise serializers.ValidationError(f'Unknown posts: {sorted(missing)}')
+        return reactions
+
+    def save(self):
+        user_id = self.context['request'].user.pk
+        self.reactions, self.removed = write_reactions({
+            (item['post'], user_id): item['reaction_type']
+            for item in self.validated_data['reactions']
+        })
+        return self.reactions
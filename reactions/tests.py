@@ -1,3 +1,200 @@
-from django.test import TestCase
+import threading
 
-# Create your tests here.
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from posts.models import Post
+from posts.tests import make_user
+from .buffer import get_reaction_buffer
+from .models import PostReaction
+from .serializers import PostReactionSerializer
+
+
+class ReactionUpsertTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(1)
+        cls.posts = [
+            Post.objects.create(user=cls.user, content=f'Call {i}', post_type='text')
+            for i in range(3)
+        ]
+
+    def counters(self, post):
+        post.refresh_from_db()
+        return post.reactions_count, post.like_count, post.insight_count
+
+    def test_repeated_post_changes_the_reaction(self):
+        self.client.force_authenticate(self.user)
+        post = self.posts[0]
+        first = self.client.post('/api/reactions/', {
+            'post': post.pk, 'user': self.user.pk, 'reaction_type': 'like',
+        })
+        self.assertEqual(first.status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.post('/api/reactions/', {
+                'post': post.pk, 'user': self.user.pk, 'reaction_type': 'insight',
+            })
+        statements = [q['sql'] for q in queries if 'SAVEPOINT' not in q['sql']]
+        # Post and user lookups, then one upsert and one counter update
+        self.assertEqual(len(statements), 4)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(second.data['reaction_type'], 'insight')
+        self.assertEqual(self.counters(post), (1, 0, 1))
+
+    def test_batch_applies_many_reactions(self):
+        self.client.force_authenticate(self.user)
+        PostReaction.objects.upsert(self.posts[2].pk, self.user.pk, 'like')
+        Post.objects.filter(pk=self.posts[2].pk).update(reactions_count=1, like_count=1)
+
+        response = self.client.post('/api/reactions/batch/', {'reactions': [
+            {'post': self.posts[0].pk, 'reaction_type': 'like'},
+            {'post': self.posts[1].pk, 'reaction_type': 'like'},
+            # The last entry for a post wins
+            {'post': self.posts[1].pk, 'reaction_type': 'insight'},
+            {'post': self.posts[2].pk, 'reaction_type': None},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(item['post'], item['reaction_type']) for item in response.data['reactions']],
+            [(self.posts[0].pk, 'like'), (self.posts[1].pk, 'insight')],
+        )
+        self.assertEqual(response.data['removed'], [self.posts[2].pk])
+        self.assertEqual(self.counters(self.posts[0]), (1, 1, 0))
+        self.assertEqual(self.counters(self.posts[1]), (1, 0, 1))
+        self.assertEqual(self.counters(self.posts[2]), (0, 0, 0))
+
+    def test_batch_rejects_unknown_posts(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/reactions/batch/', {'reactions': [
+            {'post': 0, 'reaction_type': 'like'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PostReaction.objects.exists())
+
+
+@override_settings(REACTION_WRITE_BEHIND=True, REACTION_FLUSH_INTERVAL=None)
+class ReactionWriteBehindTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other = make_user(1), make_user(2)
+        cls.post = Post.objects.create(user=cls.user, content='Viral', post_type='text')
+
+    def setUp(self):
+        self.buffer = get_reaction_buffer()
+        self.addCleanup(self.buffer.drain)
+
+    def react(self, reaction_type):
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/reactions/', {
+            'post': self.post.pk, 'user': self.user.pk, 'reaction_type': reaction_type,
+        })
+        self.assertEqual(response.status_code, 202)
+
+    def test_changes_collapse_until_flushed(self):
+        self.react('like')
+        self.react('love')
+        self.assertFalse(PostReaction.objects.exists())
+
+        # The author sees their own pending reaction, others don't yet
+        data = self.client.get(f'/api/posts/{self.post.pk}/').data
+        self.assertEqual([r['reaction_type'] for r in data['reactions']], ['love'])
+        self.assertEqual((data['reactions_count'], data['reaction_counts']['love']), (1, 1))
+        self.assertEqual(data['my_reaction'], 'love')
+        self.client.force_authenticate(self.other)
+        data = self.client.get(f'/api/posts/{self.post.pk}/').data
+        self.assertEqual(data['reactions'], [])
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(
+            list(PostReaction.objects.values_list('user_id', 'reaction_type')),
+            [(self.user.pk, 'love')],
+        )
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.reactions_count, self.post.love_count, self.post.like_count), (1, 1, 0))
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_deleting_a_reaction_discards_its_pending_change(self):
+        reaction = PostReaction.objects.create(post=self.post, user=self.user, reaction_type='like')
+        Post.objects.filter(pk=self.post.pk).update(reactions_count=1, like_count=1)
+        self.react('love')
+
+        response = self.client.delete(f'/api/reactions/{reaction.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.buffer.flush()
+        self.assertFalse(PostReaction.objects.exists())
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.reactions_count, self.post.like_count, self.post.love_count), (0, 0, 0))
+
+
+class ReactionBurstTests(TransactionTestCase):
+    """
+    Concurrent first reactions on one post never collide on the unique
+    constraint, and the counters match the rows afterwards.
+    """
+    WORKERS = 10
+
+    def test_concurrent_upserts_keep_counts_exact(self):
+        users = [make_user(n) for n in range(1, self.WORKERS + 1)]
+        post = Post.objects.create(user=users[0], content='Viral', post_type='text')
+        barrier = threading.Barrier(self.WORKERS * 2)
+        errors = []
+
+        def react(user, reaction_type):
+            try:
+                barrier.wait()
+                serializer = PostReactionSerializer(data={
+                    'post': post.pk, 'user': user.pk, 'reaction_type': reaction_type,
+                })
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        # Every user reacts twice at once, racing their own insert
+        threads = [
+            threading.Thread(target=react, args=(user, reaction_type))
+            for user in users for reaction_type in ('like', 'love')
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        post.refresh_from_db()
+        self.assertEqual(post.reactions_count, self.WORKERS)
+        self.assertEqual(
+            (post.like_count, post.love_count),
+            (
+                PostReaction.objects.filter(post=post, reaction_type='like').count(),
+                PostReaction.objects.filter(post=post, reaction_type='love').count(),
+            ),
+        )
+
+
+@override_settings(REACTION_WRITE_BEHIND=True, REACTION_FLUSH_INTERVAL=None)
+class ReactionFlushTests(TransactionTestCase):
+    """
+    Flushes commit for real here, so foreign keys are checked.
+    """
+    def setUp(self):
+        self.buffer = get_reaction_buffer()
+        self.addCleanup(self.buffer.drain)
+
+    def test_reactions_to_deleted_posts_are_dropped(self):
+        user = make_user(1)
+        kept, deleted = (
+            Post.objects.create(user=user, content=f'Call {i}', post_type='text') for i in range(2)
+        )
+        self.buffer.buffer(kept.pk, user.pk, 'like')
+        self.buffer.buffer(deleted.pk, user.pk, 'like')
+        deleted.delete()
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(list(PostReaction.objects.values_list('post_id', flat=True)), [kept.pk])
+        self.assertEqual(self.buffer.flush(), 0)
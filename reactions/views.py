@@ -1,7 +1,12 @@
 from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
+from django.db import transaction
 from rest_framework.response import Response
+from .buffer import get_reaction_buffer, write_behind_enabled
 from .models import PostReaction
-from .serializers import PostReactionSerializer
+from .serializers import PostReactionSerializer, ReactionBatchSerializer
+from news.pagination import CreatedAtKeysetPagination
+from posts.counters import adjust_post_counters, reaction_deltas
 from drf_spectacular.utils import extend_schema
 
 
@@ -9,6 +14,7 @@ from drf_spectacular.utils import extend_schema
 class PostReactionViewSet(viewsets.ModelViewSet):
     queryset = PostReaction.objects.all()
     serializer_class = PostReactionSerializer
+    pagination_class = CreatedAtKeysetPagination
     #permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -21,14 +27,54 @@ class PostReactionViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        if write_behind_enabled():
+            # Acknowledge now; the buffer writes it in the next bulk flush
+            data = serializer.validated_data
+            user = data.get('user') or request.user
+            get_reaction_buffer().buffer(data['post'].pk, user.pk, data['reaction_type'])
+            return Response({
+                'post': data['post'].pk,
+                'user': user.pk,
+                'reaction_type': data['reaction_type'],
+                'pending': True,
+            }, status=202)
         instance = serializer.save()
         return Response(self.get_serializer(instance).data)
 
+    @action(detail=False, methods=['POST'], permission_classes=[permissions.IsAuthenticated],
+            serializer_class=ReactionBatchSerializer)
+    def batch(self, request):
+        """
+        Apply many of the current user's reactions in one request, e.g. an
+        offline queue: `{"reactions": [{"post": 1, "reaction_type": "like"},
+        {"post": 2, "reaction_type": null}]}`. The writes are two statements
+        and the counters one more, whatever the batch size.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response({
+            'reactions': PostReactionSerializer(serializer.reactions, many=True).data,
+            'removed': serializer.removed,
+        })
+
     def destroy(self, request, *args, **kwargs):
         # Only allow deleting own reactions
         instance = self.get_object()
-        if instance.user != request.user:
+        if instance.user_id != request.user.pk:
             return Response({'detail': 'Not authorized to delete this reaction.'}, status=403)
         
-        self.perform_destroy(instance)
+        if write_behind_enabled():
+            # Supersede any buffered change, which the next flush would
+            # otherwise write back
+            get_reaction_buffer().buffer(instance.post_id, instance.user_id, None)
+
+        with transaction.atomic():
+            # A flush may have removed it already, and counted that
+            deleted, _ = instance.delete()
+            if deleted:
+                adjust_post_counters(
+                    instance.post_id,
+                    **reaction_deltas(instance.reaction_type, None)
+                )
         return Response(status=204)
\ No newline at end of file
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from financial_social_media.caching import track_changes
+        track_changes('users.CustomUser', ignore_fields=('last_login',))
+        track_changes('users.UserFinancialProfile')
@@ -14,11 +14,13 @@ from .serializers import (
 )
 from .permissions import IsOwnerOrReadOnly
 from drf_spectacular.utils import extend_schema
+from financial_social_media.caching import CachedResultMixin, versioned_read
 
 
 @extend_schema(tags=['Users'])
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(CachedResultMixin, viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
+    version_models = ('users.CustomUser', 'users.UserFinancialProfile')
     permission_classes = [IsOwnerOrReadOnly]
     parser_classes = [MultiPartParser, FormParser]  # Add support for file uploads
     
@@ -43,6 +45,7 @@ class UserViewSet(viewsets.ModelViewSet):
         )
 
     @action(detail=False, methods=['GET'], permission_classes=[IsAuthenticated])
+    @versioned_read
     def profile(self, request):
         user = request.user
         serializer = self.get_serializer(user)